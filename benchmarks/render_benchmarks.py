@@ -0,0 +1,368 @@
+"""
+Headless benchmarks for the photo, video and UI rendering hot paths.
+
+  python benchmarks/render_benchmarks.py --output bench.json
+
+Generates a synthetic corpus (JPEGs and PNGs of varied sizes and aspect ratios, short videos written with
+cv2.VideoWriter), then measures the zoom, translate, video and overlay paths for every SCREEN_SIZES profile:
+sustained fps, frame time percentiles, item switch latency and peak RSS.
+Each profile/path pair runs in its own process so its peak RSS is not inflated by the pairs before it.
+Runs under SDL_VIDEODRIVER=dummy unless another driver is set. The output is JSON, compare it across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# name, size
+PHOTO_CORPUS = [
+  ("landscape_12mp.jpg", (4032, 3024)),
+  ("portrait_12mp.jpg", (3024, 4032)),
+  ("wide_24mp.jpg", (6000, 4000)),
+  ("small_2mp.jpg", (1600, 1200)),
+  ("screenshot.png", (1920, 1080)),
+  ("portrait.png", (1080, 1920)),
+  ("square.png", (2048, 2048)),
+]
+# name, size, fps
+VIDEO_CORPUS = [
+  ("landscape_1080p30.mp4", (1920, 1080), 30),
+  ("landscape_720p60.mp4", (1280, 720), 60),
+  ("portrait_720p30.mp4", (720, 1280), 30),
+]
+VIDEO_SECONDS = 3
+PATHS = ("zoom", "translate", "video", "overlay")
+FRAMES_PER_PHOTO = 90
+OVERLAY_FRAMES = 300
+OVERLAY_REBUILDS = 30
+
+def make_pixels(size, seed):
+  """Gradient with noise on top, so the files compress like photos rather than flat colour."""
+  import numpy as np
+  width, height = size
+  rng = np.random.default_rng(seed)
+  x = np.linspace(0, 200, width, dtype=np.float32)
+  y = np.linspace(0, 200, height, dtype=np.float32)[:, None]
+  pixels = np.empty((height, width, 3), np.uint8)
+  pixels[..., 0] = x
+  pixels[..., 1] = y
+  pixels[..., 2] = (x + y) / 2
+  pixels += rng.integers(0, 56, (height, width, 3), dtype=np.uint8)
+  return pixels
+
+def build_corpus(corpus_dir):
+  """Write the synthetic photos and videos, files from an earlier run are reused."""
+  import cv2 # type: ignore
+  import numpy as np
+  from PIL import Image
+
+  photo_dir = os.path.join(corpus_dir, "pictures")
+  video_dir = os.path.join(corpus_dir, "videos")
+  os.makedirs(photo_dir, exist_ok=True)
+  os.makedirs(video_dir, exist_ok=True)
+
+  for seed, (name, size) in enumerate(PHOTO_CORPUS):
+    path = os.path.join(photo_dir, name)
+    if not os.path.exists(path):
+      Image.fromarray(make_pixels(size, seed)).save(path, quality=90)
+
+  for seed, (name, size, fps) in enumerate(VIDEO_CORPUS):
+    path = os.path.join(video_dir, name)
+    if os.path.exists(path):
+      continue
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    base_frame = make_pixels(size, seed)
+    for frame_index in range(VIDEO_SECONDS * fps):
+      # Pan the pattern so every frame differs
+      writer.write(np.roll(base_frame, frame_index * 8, axis=1))
+    writer.release()
+
+  return (
+    [os.path.join(photo_dir, name) for name, _ in PHOTO_CORPUS],
+    [os.path.join(video_dir, name) for name, _, _ in VIDEO_CORPUS]
+  )
+
+def summarize(samples):
+  """Millisecond percentiles of a list of durations in seconds."""
+  from utils.metrics import get_percentile
+  if not samples:
+    return None
+  ordered = sorted(samples)
+  return {
+    "count": len(ordered),
+    "mean": sum(ordered) / len(ordered) * 1000,
+    "p50": get_percentile(ordered, 50) * 1000,
+    "p95": get_percentile(ordered, 95) * 1000,
+    "p99": get_percentile(ordered, 99) * 1000,
+    "max": ordered[-1] * 1000
+  }
+
+def get_peak_rss_mb():
+  # On Linux ru_maxrss survives exec, so a case would inherit the peak of the process that started it.
+  # VmHWM is the high water mark of this process image alone.
+  try:
+    with open("/proc/self/status") as status:
+      for line in status:
+        if line.startswith("VmHWM:"):
+          return int(line.split()[1]) / 1024
+  except OSError:
+    pass
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kilobytes, macOS bytes
+  return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class Overlay:
+  """The UI as main.py draws it for a screen size: slideshow and transition buttons plus filter checkboxes."""
+  def __init__(self, screen_size, visible):
+    import main
+    from classes.uibutton import UIButton
+    from classes.uicheckbox import UICheckbox
+    from utils.loadsvgs import load_svg_as_surface
+
+    self.screen_size = screen_size
+    self.visible = visible
+    self.buttons = [
+      UIButton((24, screen_size[1] - 72, 48, 48), "", None),
+      UIButton((80, screen_size[1] - 72, 200, 48), "", None),
+    ]
+    self.filter_keys = {"family": True, "travel": False, "pets": True}
+    self.checkboxes = [UICheckbox((50, 50 + i * 40, 30, 30), key, key, None) for i, key in enumerate(self.filter_keys)]
+    self.icons = {key: load_svg_as_surface(os.path.join(REPO_DIR, path), (50, 50)) for key, path in main.ICON_PATHS.items()}
+    self.right_tap_area = main.RIGHT_TAP_AREA
+
+  def draw(self, screen):
+    from modules.draw_ui import draw_ui
+    return draw_ui(screen, self.buttons, self.checkboxes, {
+      "UI_VISIBLE": self.visible,
+      "UI_LAST_VISIBLE": time.time() if self.visible else 0,
+      "ENABLE_SLIDESHOW": True,
+      "ENABLE_TRANSITION": True
+    }, self.screen_size, self.right_tap_area, self.icons, self.filter_keys, None)
+
+def run_photo_path(screen, photo_paths, effect, frames_per_photo, overlay):
+  """
+  Draw each photo for frames_per_photo frames of the effect, as display_photo does with transitions on.
+  Items crossfade into each other, so the fade frames are part of the frame times.
+  """
+  from classes.mediahandoff import MediaHandoff
+  from modules.photo_display import load_prepared_image, draw_photo_frame, ZOOM_DURATION
+  from utils.display import present
+
+  handoff = MediaHandoff(screen.get_size())
+  frame_times = []
+  switch_times = []
+  for photo_path in photo_paths:
+    switch_start = time.perf_counter()
+    prepared = load_prepared_image(photo_path, screen)
+    for frame_index in range(frames_per_photo):
+      frame_start = time.perf_counter()
+      elapsed_time = frame_index / frames_per_photo * ZOOM_DURATION
+      draw_photo_frame(screen, prepared, effect, "left", elapsed_time, True)
+      handoff.draw(screen)
+      overlay.draw(screen)
+      present(screen)
+
+      frame_end = time.perf_counter()
+      frame_times.append(frame_end - frame_start)
+      if frame_index == 0:
+        # Decode, pre-scale and first frame on screen
+        switch_times.append(frame_end - switch_start)
+    handoff.finish(screen, lambda surface: draw_photo_frame(surface, prepared, effect, "left", ZOOM_DURATION, True))
+
+  return {
+    "fps": len(frame_times) / sum(frame_times),
+    "frame_ms": summarize(frame_times),
+    "switch_ms": summarize(switch_times)
+  }
+
+def run_video_path(screen, video_paths, overlay):
+  """Play each video through VideoDecoder the way play_video does, paced by the file's frame rate."""
+  from classes.videodecoder import VideoDecoder
+  from utils.display import present, refresh_surface
+
+  frame_times = []
+  switch_times = []
+  videos = []
+  for video_path in video_paths:
+    switch_start = time.perf_counter()
+    decoder = VideoDecoder(video_path, screen.get_size())
+    decoder.start()
+    playback_start = None
+    frame_surface = None
+    try:
+      while not decoder.finished:
+        next_surface = decoder.next_frame()
+        frame_start = time.perf_counter()
+        if next_surface:
+          refresh_surface(screen, next_surface)
+          frame_surface = next_surface
+        screen.fill((0, 0, 0))
+        if frame_surface:
+          screen.blit(frame_surface, decoder.frame_rect)
+        overlay.draw(screen)
+        present(screen)
+
+        frame_end = time.perf_counter()
+        if next_surface:
+          frame_times.append(frame_end - frame_start)
+          if playback_start is None:
+            playback_start = frame_end
+            switch_times.append(frame_end - switch_start)
+    finally:
+      decoder.stop()
+
+    playback_time = time.perf_counter() - (playback_start or switch_start)
+    videos.append({
+      "name": os.path.basename(video_path),
+      "source_fps": decoder.fps,
+      "fps": decoder.presented_frames / playback_time if playback_time else 0,
+      "presented": decoder.presented_frames,
+      "dropped": decoder.dropped_frames,
+      "late": decoder.late_frames
+    })
+
+  return {
+    "fps": sum(video["presented"] for video in videos) / sum(video["presented"] / video["fps"] for video in videos if video["fps"]),
+    "frame_ms": summarize(frame_times),
+    "switch_ms": summarize(switch_times),
+    "videos": videos
+  }
+
+def run_overlay_path(screen, photo_path, frames, rebuilds, overlay):
+  """Draw the visible UI over a still photo, then time rebuilding the overlay after a state change."""
+  from modules.draw_ui import overlay_cache
+  from modules.photo_display import load_prepared_image
+  from utils.display import present
+
+  buffer, buffer_rect, _ = load_prepared_image(photo_path, screen)
+  frame_times = []
+  for _ in range(frames):
+    frame_start = time.perf_counter()
+    screen.fill((0, 0, 0))
+    screen.blit(buffer, buffer_rect)
+    overlay.draw(screen)
+    present(screen)
+    frame_times.append(time.perf_counter() - frame_start)
+
+  rebuild_times = []
+  for _ in range(rebuilds):
+    overlay_cache["key"] = None
+    rebuild_start = time.perf_counter()
+    overlay.draw(screen)
+    rebuild_times.append(time.perf_counter() - rebuild_start)
+
+  return {
+    "fps": len(frame_times) / sum(frame_times),
+    "frame_ms": summarize(frame_times),
+    "rebuild_ms": summarize(rebuild_times)
+  }
+
+def run_case(profile, path, corpus_dir, backend, frames_per_photo, result_file):
+  # The app reads .env and its options relative to the working directory, keep it away from a real install
+  os.chdir(corpus_dir)
+  import pygame
+  import main
+  from utils.display import create_display, close_display
+
+  photo_paths, video_paths = build_corpus(corpus_dir)
+  screen_size = main.SCREEN_SIZES[profile]
+  pygame.init()
+  screen = create_display(screen_size, False, backend)
+
+  if path == "overlay":
+    result = run_overlay_path(screen, photo_paths[0], OVERLAY_FRAMES, OVERLAY_REBUILDS, Overlay(screen_size, True))
+  elif path == "video":
+    result = run_video_path(screen, video_paths, Overlay(screen_size, False))
+  else:
+    result = run_photo_path(screen, photo_paths, path, frames_per_photo, Overlay(screen_size, False))
+  result["peak_rss_mb"] = get_peak_rss_mb()
+  close_display(screen)
+
+  with open(result_file, "w") as file:
+    json.dump(result, file)
+
+def get_commit():
+  try:
+    return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def main():
+  parser = argparse.ArgumentParser(description="Headless rendering benchmarks for the photo frame.")
+  parser.add_argument("--output", help="write the JSON results here instead of stdout")
+  parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "photo-frame-benchmark-corpus"), help="where the synthetic corpus is generated and reused")
+  parser.add_argument("--profiles", nargs="+", help="SCREEN_SIZES profiles to run, all by default")
+  parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+  parser.add_argument("--backend", default=os.getenv("RENDER_BACKEND", "software"), help="RENDER_BACKEND to draw with")
+  parser.add_argument("--frames", type=int, default=FRAMES_PER_PHOTO, help="frames drawn per photo for zoom and translate")
+  parser.add_argument("--case", nargs=2, metavar=("PROFILE", "PATH"), help=argparse.SUPPRESS)
+  parser.add_argument("--result-file", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+  corpus_dir = os.path.abspath(args.corpus)
+  output_path = os.path.abspath(args.output) if args.output else None
+
+  if args.case:
+    run_case(*args.case, corpus_dir, args.backend, args.frames, args.result_file)
+    return
+
+  os.makedirs(corpus_dir, exist_ok=True)
+  os.chdir(corpus_dir)
+  import main as app
+  import pygame
+
+  corpus_start = time.perf_counter()
+  build_corpus(corpus_dir)
+  print(f"Corpus ready in {corpus_dir} ({time.perf_counter() - corpus_start:.1f}s)", file=sys.stderr)
+
+  results = {}
+  for profile in args.profiles or app.SCREEN_SIZES.keys():
+    results[profile] = {}
+    for path in args.paths:
+      with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+        command = [
+          sys.executable, os.path.abspath(__file__), "--case", profile, path,
+          "--corpus", corpus_dir, "--backend", args.backend, "--frames", str(args.frames),
+          "--result-file", result_file.name
+        ]
+        run = subprocess.run(command, capture_output=True, text=True)
+        if run.returncode != 0:
+          print(f"{profile} {path} failed:\n{run.stderr[-2000:]}", file=sys.stderr)
+          results[profile][path] = {"error": run.stderr.strip().splitlines()[-1] if run.stderr.strip() else f"exit code {run.returncode}"}
+          continue
+        results[profile][path] = json.load(result_file)
+
+      result = results[profile][path]
+      print(f"{profile} {path}: {result['fps']:.1f} fps, p95 {result['frame_ms']['p95']:.2f} ms, peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+
+  report = {
+    "commit": get_commit(),
+    "time": time.time(),
+    "python": platform.python_version(),
+    "pygame": pygame.version.ver,
+    "sdl": ".".join(str(part) for part in pygame.get_sdl_version()),
+    "machine": platform.machine(),
+    "backend": args.backend,
+    "video_driver": os.environ["SDL_VIDEODRIVER"],
+    "screen_sizes": {profile: app.SCREEN_SIZES[profile] for profile in results},
+    "results": results
+  }
+  output = json.dumps(report, indent=2)
+  if output_path:
+    with open(output_path, "w") as file:
+      file.write(output)
+  else:
+    print(output)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,40 @@
+import time
+
+class FadeTimeline:
+  """
+  Timed sequence of layers that appear at a point in time and fade out later.
+  Layers keep their surfaces for the whole sequence and only have their alpha changed in place,
+  so drawing a frame never copies or re-renders anything.
+  """
+  def __init__(self, start_time, background=None):
+    self.start_time = start_time
+    self.background = background  # fill colour drawn under the layers, None to draw over the screen
+    self.layers = []
+    self.end_time = 0
+
+  def add_layer(self, surface, position, show_at, fade_out_at, fade_duration):
+    """Show surface fully from show_at until fade_out_at, then fade it out over fade_duration seconds."""
+    if surface is None:
+      return
+    self.layers.append((surface, position, show_at, fade_out_at, fade_duration))
+    self.end_time = max(self.end_time, fade_out_at + fade_duration)
+
+  def draw(self, screen):
+    """Draw the frame for the current time. Returns False once the sequence has ended."""
+    elapsed = time.time() - self.start_time
+    if elapsed > self.end_time:
+      return False
+
+    if self.background is not None:
+      screen.fill(self.background)
+
+    for surface, position, show_at, fade_out_at, fade_duration in self.layers:
+      if elapsed < show_at or elapsed >= fade_out_at + fade_duration:
+        continue
+      alpha = 255
+      if elapsed > fade_out_at:
+        alpha = max(0, 255 - int(255 * (elapsed - fade_out_at) / fade_duration))
+      if surface.get_alpha() != alpha:
+        surface.set_alpha(alpha)
+      screen.blit(surface, position)
+    return True
@@ -0,0 +1,70 @@
+import time
+import pygame
+from utils.display import refresh_surface, to_display_format
+from utils.metrics import record
+
+CROSSFADE_DURATION = 0.6  # seconds the outgoing item takes to fade out over the incoming one
+
+class MediaHandoff:
+  """
+  Crossfade and latency tracking between media items.
+  When an item ends, finish() redraws its last media frame (without the UI) into a surface allocated once,
+  and the next item calls draw() after drawing its own frame to blend that snapshot on top with a falling alpha.
+  The blend is a single alpha blit per frame, so fade frames cost about as much as normal animation frames.
+  Handoff latency is the time from the end of one item to the first frame of the next.
+  """
+  def __init__(self, screen_size, duration=CROSSFADE_DURATION):
+    self.snapshot = to_display_format(pygame.Surface(screen_size))
+    self.duration = duration
+    self.fading = False
+    self.fade_start = None  # set on the first frame of the incoming item
+    self.finish_time = None  # perf_counter time the outgoing item ended, None once its handoff is measured
+    self.last_latency = None
+
+  def finish(self, screen, draw_last_frame=None):
+    """
+    Mark the end of the item on screen.
+    draw_last_frame(surface) draws its last media frame; without one the next item starts without a fade.
+    """
+    if not pygame.get_init():
+      # The item was left by quitting, there is no next item and the SDL2 renderer is already gone
+      return
+    self.finish_time = time.perf_counter()
+    self.fading = draw_last_frame is not None
+    self.fade_start = None
+    if self.fading:
+      self.snapshot.fill((0, 0, 0))
+      draw_last_frame(self.snapshot)
+      # The snapshot surface is reused, the SDL2 backends have to upload it again
+      refresh_surface(screen, self.snapshot)
+
+  def draw(self, screen, ready=True):
+    """
+    Blend the outgoing frame over the incoming one. Returns True while the fade is running.
+    Until the incoming item is ready, e.g. a video without a decoded frame, the outgoing frame stays fully visible.
+    """
+    if not ready:
+      if self.fading:
+        self.snapshot.set_alpha(None)
+        screen.blit(self.snapshot, (0, 0))
+      return self.fading
+
+    if self.finish_time is not None:
+      self.last_latency = time.perf_counter() - self.finish_time
+      self.finish_time = None
+      record("handoff", self.last_latency)
+      print(f"Handoff to the next item took {self.last_latency * 1000:.0f} ms")
+
+    if not self.fading:
+      return False
+    now = time.time()
+    if self.fade_start is None:
+      self.fade_start = now
+    progress = (now - self.fade_start) / self.duration
+    if progress >= 1:
+      self.fading = False
+      return False
+
+    self.snapshot.set_alpha(int(255 * (1 - progress)))
+    screen.blit(self.snapshot, (0, 0))
+    return True
@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class MediaPrefetcher:
+  """
+  Decodes and prepares upcoming playlist items on a worker thread so the render
+  loop only has to pick up a finished buffer when an item starts.
+  """
+  def __init__(self, prepare, get_upcoming, depth=2, workers=1):
+    self.prepare = prepare  # path -> prepared item, runs on the worker
+    self.get_upcoming = get_upcoming  # () -> list of paths, current item first
+    self.depth = depth
+    self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+    self.pending = {}  # path -> Future
+    self.generation = 0
+    self.lock = threading.Lock()
+
+  def refresh(self):
+    """Queue the current item plus the next `depth` items, dropping work that is no longer upcoming."""
+    wanted = self.get_upcoming()[:self.depth + 1]
+    with self.lock:
+      for path in list(self.pending):
+        if path not in wanted:
+          self.pending.pop(path).cancel()
+      for path in wanted:
+        if path not in self.pending:
+          self.pending[path] = self.executor.submit(self._run, path, self.generation)
+
+  def invalidate(self):
+    """Throw away all queued and in-flight work (e.g. the filters changed) and start over."""
+    with self.lock:
+      self.generation += 1
+      for future in self.pending.values():
+        future.cancel()
+      self.pending.clear()
+    self.refresh()
+
+  def take(self, path):
+    """Return the prepared item for path, waiting if it is still decoding. None if it was never queued."""
+    with self.lock:
+      future = self.pending.pop(path, None)
+    if future is None or future.cancelled():
+      return None
+    try:
+      return future.result()
+    except (Exception, SystemExit) as e:
+      print(f"Prefetch failed for {path}: {e}")
+      return None
+
+  def shutdown(self):
+    with self.lock:
+      self.generation += 1
+      for future in self.pending.values():
+        future.cancel()
+      self.pending.clear()
+    self.executor.shutdown(wait=False)
+
+  def _run(self, path, generation):
+    # Skip work that was queued before the last invalidate
+    if generation != self.generation:
+      return None
+    return self.prepare(path)
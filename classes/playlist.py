@@ -0,0 +1,117 @@
+import random
+from collections import deque
+
+HISTORY_SIZE = 50  # items kept for stepping back with previous()
+
+class Playlist:
+  """
+  Shuffled play order over the media that passes the tag filter.
+  The filtered order is only rebuilt when the filter changes; the next item is an index step,
+  and each cycle is reshuffled at the end without repeating the last item first.
+  Shown items go into a history ring; after stepping back, next() replays the stepped over items first.
+  """
+  def __init__(self, tag_index):
+    self.tag_index = tag_index
+    self.items = {}  # path -> media type, every known item whether filtered or not
+    self.order = []  # (media type, path) for the allowed items, in play order for this cycle
+    self.next_order = None  # shuffled order for the next cycle, made on demand
+    self.position = -1
+    self.current = None
+    self.history = deque(maxlen=HISTORY_SIZE)  # items shown before the current one, most recent last
+    self.replay = []  # items stepped back over, next() returns them before continuing the order, most recent last
+    self.from_history = False  # the current item was reached by stepping back or replaying
+
+  def add(self, media_type, path):
+    if path in self.items:
+      return
+    self.items[path] = media_type
+    self.refresh_item(path)
+
+  def remove(self, path):
+    if self.items.pop(path, None) is not None:
+      self._remove_from_order(path)
+
+  def refresh_item(self, path):
+    """Bring a single item's place in the order in line with its current tags."""
+    in_order = any(item_path == path for _, item_path in self.order)
+    allowed = path in self.items and self.tag_index.is_allowed(path)
+    if allowed and not in_order:
+      # Join the part of this cycle that has not played yet
+      self.order.insert(random.randint(self.position + 1, len(self.order)), (self.items[path], path))
+      self.next_order = None
+    elif in_order and not allowed:
+      self._remove_from_order(path)
+
+  def rebuild(self):
+    """Rebuild the filtered order after the filter changed and start a new cycle."""
+    self.order = self._shuffled_cycle()
+    self.next_order = None
+    self.position = -1
+
+  def next(self):
+    """Move to the next item and return it as (media type, path), or None if nothing passes the filter."""
+    if self.current is not None:
+      self.history.append(self.current)
+    while self.replay:
+      item = self.replay.pop()
+      if self._is_playable(item):
+        self.current = item
+        self.from_history = True
+        return item
+    self.from_history = False
+
+    if not self.order:
+      self.current = None
+      return None
+    self.position += 1
+    if self.position >= len(self.order):
+      self.order = self.next_order or self._shuffled_cycle()
+      self.next_order = None
+      self.position = 0
+    self.current = self.order[self.position]
+    return self.current
+
+  def previous(self):
+    """Step back to the item shown before the current one and return it, or None if there is no history left."""
+    while self.history:
+      item = self.history.pop()
+      if self._is_playable(item):
+        if self.current is not None:
+          self.replay.append(self.current)
+        self.current = item
+        self.from_history = True
+        return item
+    return None
+
+  def peek(self, count, media_type=None):
+    """The next `count` items after the current one, continuing into the next cycle if needed."""
+    upcoming = [item for item in reversed(self.replay) if self._is_playable(item) and media_type in (None, item[0])]
+    upcoming += [item for item in self.order[self.position + 1:] if media_type in (None, item[0])]
+    if len(upcoming) < count and self.order:
+      if self.next_order is None:
+        self.next_order = self._shuffled_cycle(self.order[-1])
+      upcoming += [item for item in self.next_order if media_type in (None, item[0])]
+    return upcoming[:count]
+
+  def _is_playable(self, item):
+    # History entries are checked when they are reached, items may have been removed or filtered out since
+    return item[1] in self.items and self.tag_index.is_allowed(item[1])
+
+  def _shuffled_cycle(self, last=None):
+    last = last or self.current
+    order = [(media_type, path) for path, media_type in self.items.items() if self.tag_index.is_allowed(path)]
+    random.shuffle(order)
+    # Never play the same item twice in a row across the cycle boundary
+    if len(order) > 1 and order[0] == last:
+      swap = random.randint(1, len(order) - 1)
+      order[0], order[swap] = order[swap], order[0]
+    return order
+
+  def _remove_from_order(self, path):
+    for index, (_, item_path) in enumerate(self.order):
+      if item_path == path:
+        del self.order[index]
+        if index <= self.position:
+          self.position -= 1
+        break
+    self.next_order = None
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+class RecentItemCache:
+  """
+  LRU of the prepared (decoded and pre-scaled) photos shown most recently,
+  so stepping back through the history costs a blit instead of a decode.
+  """
+  def __init__(self, size):
+    self.size = size
+    self.items = OrderedDict()  # path -> prepared item, least recently used first
+    self.hits = 0
+    self.misses = 0
+
+  def __contains__(self, path):
+    return path in self.items
+
+  def get(self, path, count=True):
+    """Cached item for path or None. Only lookups with count update the hit and miss stats."""
+    prepared = self.items.get(path)
+    if prepared is None:
+      if count:
+        self.misses += 1
+      return None
+    self.items.move_to_end(path)
+    if count:
+      self.hits += 1
+    return prepared
+
+  def put(self, path, prepared):
+    if self.size <= 0:
+      return
+    self.items[path] = prepared
+    self.items.move_to_end(path)
+    while len(self.items) > self.size:
+      self.items.popitem(last=False)
+
+  def discard(self, path):
+    self.items.pop(path, None)
+
+  def get_stats(self):
+    lookups = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "size": len(self.items),
+      "hit_rate": self.hits / lookups if lookups else 0
+    }
@@ -0,0 +1,24 @@
+import time
+import pygame
+
+class RenderScheduler:
+  """
+  Paces a display loop. While something animates, frames are capped at fps_cap;
+  otherwise the loop blocks in pygame.event.wait until input arrives or the next deadline passes.
+  """
+  def __init__(self, clock, fps_cap):
+    self.clock = clock
+    self.fps_cap = fps_cap
+
+  def wait(self, animating, deadline):
+    """Wait for the next frame and return the events that arrived in the meantime."""
+    timeout = int((deadline - time.time()) * 1000)
+    # A deadline that has already passed is due now, pygame.event.wait(0) would block forever
+    if animating or timeout <= 0:
+      self.clock.tick(self.fps_cap)
+      return pygame.event.get()
+
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+      return []
+    return [event] + pygame.event.get()
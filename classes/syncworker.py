@@ -0,0 +1,40 @@
+import queue
+import threading
+
+class SyncWorker:
+  """
+  Runs the media sync on a background thread every `interval` seconds.
+  Results are queued for the render thread to merge between items with poll().
+  The sync can also report partial results while it runs through the callback it is given.
+  """
+  def __init__(self, sync, interval, initial_delay=None):
+    self.sync = sync  # (report) -> result, runs on the worker thread
+    self.interval = interval
+    self.initial_delay = interval if initial_delay is None else initial_delay
+    self.results = queue.Queue()
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self._run, name="sync-worker", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def stop(self):
+    self.stopped.set()
+
+  def poll(self):
+    """Return every result finished since the last poll, oldest first. Never blocks."""
+    results = []
+    while True:
+      try:
+        results.append(self.results.get_nowait())
+      except queue.Empty:
+        return results
+
+  def _run(self):
+    delay = self.initial_delay
+    while not self.stopped.wait(delay):
+      try:
+        self.results.put(self.sync(self.results.put))
+      except Exception as e:
+        print(f"Background sync failed: {e}")
+      delay = self.interval
@@ -0,0 +1,42 @@
+class TagIndex:
+  """
+  Precomputed tag filter. Each tag gets a bit, each media item stores the bitmask of its tags
+  and the active filter is a single mask of the disabled tags, so checking an item is one AND.
+  A count of allowed items is kept up to date so "does anything match" is O(1).
+  """
+  def __init__(self):
+    self.tag_bits = {}  # tag -> bit value
+    self.item_masks = {}  # media path -> bitmask of its tags
+    self.blocked_mask = 0
+    self.allowed_count = 0
+
+  def get_mask(self, tags):
+    mask = 0
+    for tag in tags:
+      if tag not in self.tag_bits:
+        self.tag_bits[tag] = 1 << len(self.tag_bits)
+      mask |= self.tag_bits[tag]
+    return mask
+
+  def set_item(self, path, contents):
+    """Add or update an item from its comma separated `contents` metadata."""
+    self.remove_item(path)
+    mask = self.get_mask(tag for tag in (contents or "").split(",") if tag)
+    self.item_masks[path] = mask
+    if not mask & self.blocked_mask:
+      self.allowed_count += 1
+
+  def remove_item(self, path):
+    mask = self.item_masks.pop(path, None)
+    if mask is not None and not mask & self.blocked_mask:
+      self.allowed_count -= 1
+
+  def set_filter(self, filter_keys):
+    """Apply FILTER_KEYS, where a False value hides every item carrying that tag."""
+    blocked_mask = self.get_mask(tag for tag, enabled in filter_keys.items() if enabled == False)
+    if blocked_mask != self.blocked_mask:
+      self.blocked_mask = blocked_mask
+      self.allowed_count = sum(1 for mask in self.item_masks.values() if not mask & blocked_mask)
+
+  def is_allowed(self, path):
+    return not self.item_masks.get(path, 0) & self.blocked_mask
@@ -0,0 +1,91 @@
+import weakref
+import pygame
+from pygame._sdl2.video import Texture
+
+BLENDMODE_BLEND = 1  # SDL_BLENDMODE_BLEND, lets surface alpha fade the texture
+
+class TextureCanvas:
+  """
+  Drawing target of the SDL2 renderer backend, used in place of the display surface.
+  It offers the part of the Surface API the display code draws with (blit, fill, get_size, get_rect)
+  and draws every surface as a texture on the renderer.
+  A surface is uploaded the first time it is drawn and its texture is freed together with the surface,
+  so photo buffers, cached text and the UI overlay are uploaded once, not every frame.
+  """
+  def __init__(self, renderer, size):
+    self.renderer = renderer
+    self.size = tuple(size)
+    self.textures = {}  # id(surface) -> (weakref to the surface, texture)
+    self.uploads = 0
+
+  def get_size(self):
+    return self.size
+
+  def get_width(self):
+    return self.size[0]
+
+  def get_height(self):
+    return self.size[1]
+
+  def get_rect(self, **kwargs):
+    rect = pygame.Rect((0, 0), self.size)
+    for key, value in kwargs.items():
+      setattr(rect, key, value)
+    return rect
+
+  def get_texture(self, surface):
+    entry = self.textures.get(id(surface))
+    if entry:
+      return entry[1]
+
+    key = id(surface)
+    texture = Texture.from_surface(self.renderer, surface)
+    texture.blend_mode = BLENDMODE_BLEND
+    # The callback runs while the surface is freed, before its id can be handed to another surface
+    self.textures[key] = (weakref.ref(surface, lambda _: self.textures.pop(key, None)), texture)
+    self.uploads += 1
+    return texture
+
+  def upload(self, surface):
+    """Upload the pixels of a surface that was changed in place, e.g. a recycled video frame buffer."""
+    entry = self.textures.get(id(surface))
+    if entry:
+      entry[1].update(surface)
+      self.uploads += 1
+    else:
+      self.get_texture(surface)
+
+  def blit(self, surface, dest, area=None):
+    texture = self.get_texture(surface)
+    # Fades set the surface alpha in place, carry it over to the texture on every draw
+    alpha = surface.get_alpha()
+    texture.alpha = 255 if alpha is None else alpha
+
+    source_rect = pygame.Rect(area) if area else surface.get_rect()
+    dest_rect = pygame.Rect(dest[0], dest[1], source_rect.width, source_rect.height)
+    texture.draw(srcrect=source_rect, dstrect=dest_rect)
+    return dest_rect
+
+  def blit_scaled(self, surface, area, dest_rect):
+    """Draw area of surface stretched over dest_rect, the scaling is done by the renderer."""
+    texture = self.get_texture(surface)
+    texture.alpha = 255
+    texture.draw(srcrect=area, dstrect=dest_rect)
+
+  def fill(self, color, rect=None):
+    self.renderer.draw_color = pygame.Color(color)
+    if rect is None:
+      self.renderer.clear()
+    else:
+      self.renderer.fill_rect(rect)
+
+  def present(self):
+    self.renderer.present()
+
+  def get_stats(self):
+    return {"textures": len(self.textures), "uploads": self.uploads}
+
+  def close(self):
+    """Free the textures and the renderer. Call before pygame.quit(), SDL crashes destroying them after it."""
+    self.textures.clear()
+    self.renderer = None
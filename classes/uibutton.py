@@ -1,4 +1,5 @@
 import pygame
+from utils.fonts import render_text
 
 class UIButton:
   def __init__(self, rect, text, action):
@@ -6,13 +7,15 @@ class UIButton:
     self.text = text
     self.action = action
 
-  def draw(self, screen, font):
+  def draw(self, screen, font_size):
     pygame.draw.rect(screen, (0, 0, 0), self.rect)  # Black background for button
-    label = font.render(self.text, True, (255, 255, 255))
+    label = render_text(self.text, font_size, (255, 255, 255))
     label_rect = label.get_rect(center=self.rect.center)
     screen.blit(label, label_rect)
 
   def handle_event(self, event):
     if event.type == pygame.MOUSEBUTTONDOWN:
       if self.rect.collidepoint(event.pos):
-        self.action()
\ No newline at end of file
+        self.action()
+        return True
+    return False
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pygame
+from utils.fonts import render_text
 
 class UICheckbox:
   def __init__(self, rect, text, key, toggle_action):
@@ -7,7 +8,7 @@ class UICheckbox:
     self.key = key
     self.toggle_action = toggle_action
 
-  def draw(self, screen, font, ticked):
+  def draw(self, screen, font_size, ticked):
     # Draw checkbox border
     pygame.draw.rect(screen, (255, 255, 255), self.rect, 2)
 
@@ -16,11 +17,13 @@ class UICheckbox:
       pygame.draw.rect(screen, (255, 255, 255), self.rect)
 
     # Draw text label
-    label = font.render(self.text, True, (255, 255, 255))
+    label = render_text(self.text, font_size, (255, 255, 255))
     label_rect = label.get_rect(midleft=(self.rect.right + 10, self.rect.centery))
     screen.blit(label, label_rect)
 
   def handle_event(self, event):
     if event.type == pygame.MOUSEBUTTONDOWN:
       if self.rect.collidepoint(event.pos):
-        self.toggle_action(self.key)
\ No newline at end of file
+        self.toggle_action(self.key)
+        return True
+    return False
\ No newline at end of file
@@ -0,0 +1,184 @@
+import cv2 # type: ignore
+import ctypes
+import math
+import numpy as np
+import pygame
+import queue
+import threading
+import time
+from utils.metrics import timed
+
+DEFAULT_VIDEO_FPS = 30
+_END_OF_VIDEO = object()
+
+def get_letterbox_rect(video_size, screen_size):
+  """Largest rect with the video's aspect ratio that fits the screen, centered."""
+  video_width, video_height = video_size
+  screen_width, screen_height = screen_size
+  if not video_width or not video_height:
+    return pygame.Rect(0, 0, screen_width, screen_height)
+
+  scale = min(screen_width / video_width, screen_height / video_height)
+  frame_rect = pygame.Rect(0, 0, int(video_width * scale), int(video_height * scale))
+  frame_rect.center = (screen_width // 2, screen_height // 2)
+  return frame_rect
+
+# Byte order of the 32-bit pixel formats slots can use (little endian) -> conversion from OpenCV's BGR
+SLOT_CONVERSIONS = {
+  (0xff0000, 0xff00, 0xff): cv2.COLOR_BGR2BGRA,  # XRGB8888, what displays usually are
+  (0xff, 0xff00, 0xff0000): cv2.COLOR_BGR2RGBA  # XBGR8888
+}
+SLOT_MASKS = (0xff0000, 0xff00, 0xff, 0)
+
+def create_slot_surface(size):
+  """A Surface in the display's pixel format, so blitting a frame is a plain copy. Returns it with its BGR conversion."""
+  display = pygame.display.get_surface()
+  if display is not None and display.get_bitsize() == 32 and display.get_masks()[:3] in SLOT_CONVERSIONS:
+    surface = pygame.Surface(size, 0, display)
+  else:
+    # No display surface with the SDL2 backends, XRGB8888 uploads to a texture without conversion
+    surface = pygame.Surface(size, 0, 32, SLOT_MASKS)
+  return surface, SLOT_CONVERSIONS[surface.get_masks()[:3]]
+
+def get_pixel_array(surface):
+  """
+  Writable (height, width, 4) array over the pixels of a 32-bit surface.
+  Unlike get_view() it does not lock the surface, which could then not be blitted.
+  It is only valid while the surface exists.
+  """
+  width, height = surface.get_size()
+  pixels = (ctypes.c_uint8 * (surface.get_pitch() * height)).from_address(surface._pixels_address)
+  return np.ctypeslib.as_array(pixels).reshape(height, surface.get_pitch() // 4, 4)[:, :width]
+
+class VideoDecoder:
+  """
+  Decodes a video on a producer thread into a bounded frame queue and paces
+  presentation by the file's own frame rate and frame timestamps.
+  When playback falls behind, frames are skipped with grab() so they are never decoded to pixels.
+
+  Frames are converted with dst= straight into the pixels of a ring of preallocated Surfaces in the
+  display's pixel format, so steady state playback allocates nothing and blits without converting.
+  """
+  def __init__(self, video_path, screen_size, queue_size=4):
+    self.cap = cv2.VideoCapture(video_path)
+    source_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    self.frame_rect = get_letterbox_rect(source_size, screen_size)
+    fps = self.cap.get(cv2.CAP_PROP_FPS)
+    self.fps = fps if fps and fps > 0 and not math.isnan(fps) else DEFAULT_VIDEO_FPS
+    self.frame_duration = 1 / self.fps
+    self.frames = queue.Queue(maxsize=queue_size)
+
+    # One slot per queued frame, plus the frame on screen and the one being decoded
+    width, height = self.frame_rect.size
+    self.raw_frame = None
+    self.resized_frame = np.empty((height, width, 3), np.uint8)
+    self.slot_surfaces = []
+    for _ in range(queue_size + 2):
+      surface, self.slot_conversion = create_slot_surface((width, height))
+      self.slot_surfaces.append(surface)
+    self.slot_buffers = [get_pixel_array(surface) for surface in self.slot_surfaces]
+    self.finished = False
+    self.start_time = None  # wall clock time of timestamp 0, set when the first frame is shown
+
+    # Playback stats
+    self.presented_frames = 0
+    self.dropped_frames = 0  # never shown, either grabbed without retrieve or discarded for a newer frame
+    self.late_frames = 0  # shown more than a frame after they were due
+    self.lock = threading.Lock()
+
+    self.stopped = threading.Event()
+    self.thread = threading.Thread(target=self._decode, name="video-decoder", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def stop(self):
+    self.stopped.set()
+    # Unblock the producer if it is waiting on a full queue
+    while True:
+      try:
+        self.frames.get_nowait()
+      except queue.Empty:
+        break
+    self.thread.join(timeout=1)
+
+  def next_frame(self):
+    """
+    Wait until the next frame is due and return its Surface.
+    The Surface stays valid until the following call.
+    Returns None if no frame was ready within a frame duration; `finished` is set at the end of the video.
+    """
+    while True:
+      try:
+        item = self.frames.get(timeout=self.frame_duration)
+      except queue.Empty:
+        return None
+      if item is _END_OF_VIDEO:
+        self.finished = True
+        return None
+
+      timestamp, slot = item
+      if self.start_time is None:
+        self.start_time = time.time() - timestamp
+
+      delay = self.start_time + timestamp - time.time()
+      if delay < -self.frame_duration:
+        # Already a frame behind, jump to a newer frame if one is waiting
+        if not self.frames.empty():
+          with self.lock:
+            self.dropped_frames += 1
+          continue
+        self.late_frames += 1
+      elif delay > 0:
+        time.sleep(delay)
+
+      self.presented_frames += 1
+      return self.slot_surfaces[slot]
+
+  def _is_behind(self, frame_index):
+    if self.start_time is None:
+      return False
+    return time.time() - self.start_time > (frame_index + 1) * self.frame_duration
+
+  def _decode(self):
+    frame_index = 0
+    # Slots are handed out in turn per decoded frame, skipped frames must not advance it or a queued slot gets reused
+    next_slot = 0
+    try:
+      while not self.stopped.is_set():
+        if self._is_behind(frame_index):
+          # Too late to show this frame, advance the stream without decoding pixels
+          if not self.cap.grab():
+            break
+          with self.lock:
+            self.dropped_frames += 1
+          frame_index += 1
+          continue
+
+        with timed("video.decode"):
+          ret, self.raw_frame = self.cap.read(self.raw_frame)
+        if not ret:
+          break
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        timestamp = position / 1000 if position > 0 else frame_index * self.frame_duration
+
+        frame = self.raw_frame
+        slot = next_slot
+        next_slot = (next_slot + 1) % len(self.slot_buffers)
+        with timed("video.resize"):
+          if frame.shape != self.resized_frame.shape:
+            frame = cv2.resize(frame, self.frame_rect.size, dst=self.resized_frame)
+          cv2.cvtColor(frame, self.slot_conversion, dst=self.slot_buffers[slot])
+        self._put((timestamp, slot))
+        frame_index += 1
+      self._put(_END_OF_VIDEO)
+    finally:
+      self.cap.release()
+
+  def _put(self, item):
+    while not self.stopped.is_set():
+      try:
+        self.frames.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        continue
@@ -1,19 +1,31 @@
+import time
+BOOT_TIME = time.time()
+
 import pygame
 import random
 import sys
-import time
 import os
-import cairosvg  # type: ignore
 
 from pygame.locals import * # type: ignore
-from modules.photo_display import display_photo
+from modules.photo_display import display_photo, load_prepared_image
 from modules.video_display import play_video  
 from modules.draw_ui import draw_ui, show_splash_overlay, preload_splash_image, show_first_run
 from classes.uibutton import UIButton
 from classes.uicheckbox import UICheckbox
+from classes.mediaprefetcher import MediaPrefetcher
+from classes.syncworker import SyncWorker
+from classes.tagindex import TagIndex
+from classes.playlist import Playlist
+from classes.recentitemcache import RecentItemCache
+from classes.renderscheduler import RenderScheduler
+from classes.mediahandoff import MediaHandoff
 from utils.loadsvgs import load_svg_as_surface
-from utils.loadfiles import get_unique_content_keys, load_files, load_metadata, write_options_json, read_options_json
+from utils.loadfiles import init_storage, get_unique_content_keys, load_files, load_metadata, write_options_json, read_options_json
 from utils.checkdeps import wait_for_server_available
+from utils.display import create_display, close_display, present
+from utils.fonts import get_text_cache_stats
+from utils.metrics import timed, add_gauge, start_export as start_metrics_export, stop_export as stop_metrics_export
+from utils.ingest import build_derivatives, build_proxies, find_derivative, find_proxy, shutdown_builds
 
 from dotenv import load_dotenv
 load_dotenv(verbose=True, override=True)
@@ -26,8 +38,24 @@ SCREEN_SIZES = {
 
 SCREEN_SIZE = "7inch"
 
+# Frame rate the photo effects are paced at for each screen size.
+# display_photo logs the fps it actually achieved against this target.
+PHOTO_FPS_TARGETS = {
+  "7inch": 60,
+  "10inch": 45,
+  "15inch": 30,
+}
+
+# Frame rate cap for effect animations, overrides the per screen target when set
+PHOTO_FPS = int(os.getenv("PHOTO_FPS", PHOTO_FPS_TARGETS[SCREEN_SIZE]))
+
+# How frames are drawn: "software" surface blits, or SDL2 textures with "sdl2" (GPU) / "sdl2-software"
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "software")
+
 LOCAL_PHOTO_DIR = "pictures"
 LOCAL_VIDEO_DIR = "videos"
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
 IMAGES = []
 VIDEOS = []
 
@@ -50,9 +78,23 @@ UI_VISIBLE = True
 UI_LAST_VISIBLE = time.time()
 
 RIGHT_TAP_AREA = 1/6
+LEFT_TAP_AREA = 1/6
+
+# Number of upcoming photos decoded ahead of time on the prefetch thread
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 2))
+
+# Number of recently shown photos kept decoded, so going back does not decode them again
+RECENT_CACHE_SIZE = int(os.getenv("RECENT_CACHE_SIZE", 3))
+
+# Seconds between background syncs with Azure
+SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", 900))
 
 config = {}
 loaded_icons = {}
+prefetcher = None
+tag_index = TagIndex()
+playlist = Playlist(tag_index)
+recent_items = RecentItemCache(RECENT_CACHE_SIZE)
 
 # Splash screen
 splash_image_path = None
@@ -64,6 +106,22 @@ splash_start_time = time.time()
 first_run_active = True
 first_run_start_time = time.time()
 
+# Set when the first media frame is drawn, to report time to first photo
+first_media_frame_time = None
+
+# Cold start phases in order, (phase, time it finished)
+startup_phases = []
+
+def mark_startup_phase(phase):
+  startup_phases.append((phase, time.time()))
+
+def print_startup_report():
+  print("Startup phases:")
+  phase_start = BOOT_TIME
+  for phase, phase_end in startup_phases:
+    print(f"  {phase}: {phase_end - phase_start:.2f}s")
+    phase_start = phase_end
+
 ## ---------------- System ----------------
 
 def write_new_options():
@@ -111,6 +169,19 @@ def toggle_filter_key(key):
   FILTER_KEYS[key] = not FILTER_KEYS[key]
   UI_LAST_VISIBLE = time.time()
   write_new_options()
+  tag_index.set_filter(FILTER_KEYS)
+  playlist.rebuild()
+  
+  # Upcoming items may no longer pass the filter
+  if prefetcher:
+    prefetcher.invalidate()
+
+def add_filter_checkbox(key):
+  checklist_x = 50  # X position for the checklist
+  checklist_y = 50  # Starting Y position for the checklist
+  item_height = 40  # Height of each checklist item
+  rect = (checklist_x, checklist_y + len(checkboxes) * item_height, 30, 30)
+  checkboxes.append(UICheckbox(rect, key, key, toggle_filter_key))
 
 buttons = [
   UIButton((24, SCREEN_SIZES[SCREEN_SIZE][1] - 72, 48, 48), "", toggle_slideshow),
@@ -127,66 +198,101 @@ def display_first_run(screen):
   global first_run_active, first_run_start_time
   return show_first_run(screen, splash_image, first_run_start_time)
   
+# Returns when the UI layer next needs a redraw: now while a sequence animates, None when static
 def draw(screen):
   global splash_active, first_run_active, FIRST_RUN
-  if first_run_active:
-    first_run_active = display_first_run(screen)
-    if not first_run_active:
-      FIRST_RUN = False
-      write_new_options()
-  elif splash_active:
-    splash_active = display_splash(screen)
-  else:
-    draw_ui(screen, buttons, checkboxes, {
-      "UI_VISIBLE": UI_VISIBLE,
-      "UI_LAST_VISIBLE": UI_LAST_VISIBLE,
-      "ENABLE_SLIDESHOW": ENABLE_SLIDESHOW,
-      "ENABLE_TRANSITION": ENABLE_TRANSITION
-    }, SCREEN_SIZES[SCREEN_SIZE], RIGHT_TAP_AREA, loaded_icons, FILTER_KEYS, toggle_filter_key)
+  with timed("draw"):
+    if first_run_active:
+      first_run_active = display_first_run(screen)
+      if not first_run_active:
+        FIRST_RUN = False
+        write_new_options()
+      return time.time()
+    elif splash_active:
+      splash_active = display_splash(screen)
+      return time.time()
+    else:
+      return draw_ui(screen, buttons, checkboxes, {
+        "UI_VISIBLE": UI_VISIBLE,
+        "UI_LAST_VISIBLE": UI_LAST_VISIBLE,
+        "ENABLE_SLIDESHOW": ENABLE_SLIDESHOW,
+        "ENABLE_TRANSITION": ENABLE_TRANSITION
+      }, SCREEN_SIZES[SCREEN_SIZE], RIGHT_TAP_AREA, loaded_icons, FILTER_KEYS, toggle_filter_key)
+
+# Draw callback for the media loops, also records when the first media frame reaches the screen
+def draw_media_frame(screen):
+  global first_media_frame_time
+  if first_media_frame_time is None:
+    first_media_frame_time = time.time()
+    mark_startup_phase("first media frame")
+    print(f"Time to first photo: {first_media_frame_time - BOOT_TIME:.2f}s")
+    print_startup_report()
+  return draw(screen)
 
 ## ---------------- MAIN ----------------
-def generate_content_order(images, videos):
-  content_order = [("image", img) for img in images] + [("video", vid) for vid in videos]
-  random.shuffle(content_order)
-  return content_order
-
-# Check if there exists any content in the content list that matches the filter keys
-def check_any_content_matches(metadata, content_list, filter_keys):
-  some_content_matches = False
-  for _, media_path in content_list:
-    if media_path in metadata and "contents" in metadata[media_path]:
-      contents = metadata[media_path]["contents"]  # "dog,cat,beach"
-      meta_contents_list = contents.split(",")
-      
-      missing_content = False
-      for content in meta_contents_list: # dog in "dog", "cat"
-        if content in filter_keys and filter_keys[content] == False:
-          print(f"Content {content} is filtered out due to filter keys.")
-          missing_content = True
-          break
-        
-      if not missing_content:
-        print(f"Content {contents} matches the filter keys.")
-        some_content_matches = True
-        break
-        
-  return some_content_matches
+# Prefer the screen sized derivative built at sync time over the original upload
+def resolve_photo_path(image_path):
+  return find_derivative(image_path, SCREEN_SIZES[SCREEN_SIZE]) or image_path
+
+# Prefer the screen resolution proxy built at sync time over the original upload
+def resolve_video_path(video_path):
+  return find_proxy(video_path, SCREEN_SIZES[SCREEN_SIZE]) or video_path
+
+def list_local_media():
+  os.makedirs(LOCAL_PHOTO_DIR, exist_ok=True)
+  os.makedirs(LOCAL_VIDEO_DIR, exist_ok=True)
+  images = [os.path.join(LOCAL_PHOTO_DIR, f) for f in os.listdir(LOCAL_PHOTO_DIR) if f.endswith(PHOTO_EXTENSIONS)]
+  videos = [os.path.join(LOCAL_VIDEO_DIR, f) for f in os.listdir(LOCAL_VIDEO_DIR) if f.endswith(VIDEO_EXTENSIONS)]
+  return images, videos
+
+def get_media_type(path):
+  if os.path.dirname(path) == LOCAL_PHOTO_DIR and path.endswith(PHOTO_EXTENSIONS):
+    return "image"
+  if os.path.dirname(path) == LOCAL_VIDEO_DIR and path.endswith(VIDEO_EXTENSIONS):
+    return "video"
+  return None
+
+# Download, then prepare derivatives and proxies. Runs on the sync worker thread.
+# Each finished download is reported straight away so it can join the rotation before the sync completes.
+def run_sync(report):
+  load_files(lambda path, file_metadata: report({"downloaded": path, "metadata": file_metadata}))
+  images, videos = list_local_media()
+  
+  # Decode each new or changed photo once into a screen sized derivative, and transcode videos to proxies
+  build_derivatives(images, SCREEN_SIZES[SCREEN_SIZE])
+  build_proxies(videos, SCREEN_SIZES[SCREEN_SIZE])
+  
+  return {
+    "images": images,
+    "videos": videos,
+    "metadata": load_metadata()
+  }
+
+# Index the tags of a media item so filter checks are a single mask test
+def index_media(metadata, media_path):
+  tag_index.set_item(media_path, metadata.get(media_path, {}).get("contents", ""))
 
 def main():
-  global config, loaded_icons, splash_image_path, splash_image, FILTER_KEYS, first_run_active
+  global config, loaded_icons, splash_image_path, splash_image, FILTER_KEYS, first_run_active, prefetcher
 
   # Check for X server availability
+  mark_startup_phase("imports")
   wait_for_server_available()
+  mark_startup_phase("X server")
+
+  # Storage settings and local folders, may prompt for the Azure details on a fresh install
+  init_storage()
+  mark_startup_phase("storage init")
 
   # Initialize Pygame
   pygame.init()
-  if FULL_SCREEN:
-    screen = pygame.display.set_mode(SCREEN_SIZES[SCREEN_SIZE], pygame.FULLSCREEN | pygame.NOFRAME)
-  else:
-    screen = pygame.display.set_mode(SCREEN_SIZES[SCREEN_SIZE])
-  pygame.display.set_caption("Digital Photo Frame")
+  screen = create_display(SCREEN_SIZES[SCREEN_SIZE], FULL_SCREEN, RENDER_BACKEND)
   pygame.mouse.set_visible(not FULL_SCREEN)
   clock = pygame.time.Clock()
+  idle_scheduler = RenderScheduler(clock, PHOTO_FPS)
+  # Snapshot of the outgoing item the next one crossfades from, allocated once
+  handoff = MediaHandoff(SCREEN_SIZES[SCREEN_SIZE])
+  mark_startup_phase("display")
   
   # Preload splash image
   splash_folder = "splash"
@@ -203,14 +309,10 @@ def main():
     key: load_svg_as_surface(path, (50, 50))  # Resize icons to 50x50
     for key, path in ICON_PATHS.items()
   }
+  mark_startup_phase("splash and icons")
   
-  # #Download files
-  load_files()
-  
-  # Load downloaded media
-  IMAGES = [os.path.join(LOCAL_PHOTO_DIR, f) for f in os.listdir(LOCAL_PHOTO_DIR) if f.endswith(('.jpg', '.jpeg', '.png'))]
-  VIDEOS = [os.path.join(LOCAL_VIDEO_DIR, f) for f in os.listdir(LOCAL_VIDEO_DIR) if f.endswith(('.mp4', '.avi', '.mov'))]
-  
+  # Start from whatever is already on disk, the first sync runs in the background
+  IMAGES, VIDEOS = list_local_media()
   metadata = load_metadata()
   FILTER_KEYS = get_unique_content_keys(metadata)
   print(metadata)
@@ -223,54 +325,143 @@ def main():
   ###### Run the main loop ######
   
   # Setup checkboxes
-  checklist_x = 50  # X position for the checklist
-  checklist_y = 50  # Starting Y position for the checklist
-  item_height = 40  # Height of each checklist item
-  for i, key in enumerate(FILTER_KEYS.keys()):
-    rect = (checklist_x, checklist_y + i * item_height, 30, 30)
-    checkboxes.append(UICheckbox(rect, key, key, toggle_filter_key))
+  for key in FILTER_KEYS.keys():
+    add_filter_checkbox(key)
   
-  media_index = -1
   media_type = None  
   media_path = None
   
   # Prevents a double advance if the loop ends due to interruption
   triggered_button_event = False
   
-  # Generate content order
-  content_order = generate_content_order(IMAGES, VIDEOS) # [('video', 'path_to/video.mp4'), ('image', 'path_to/image.jpg')]
+  # Build the playlist
+  for item_type, paths in (("image", IMAGES), ("video", VIDEOS)):
+    for path in paths:
+      index_media(metadata, path)
+      playlist.add(item_type, path)
+  tag_index.set_filter(FILTER_KEYS)
+  playlist.rebuild()
+  mark_startup_phase("local media index")
+  
   def advance_media():
-    nonlocal content_order
-    nonlocal media_index, media_type, media_path 
+    nonlocal media_type, media_path 
     
-    media_index += 1
-    media_type, media_path = content_order[media_index % len(content_order)]
-    print(f"Advancing to {media_type} {media_path}, index: {media_index}")
-        
-    # Check the metadata of this media
-    if media_path in metadata and "contents" in metadata[media_path]:
-      contents = metadata[media_path]["contents"]
+    with timed("advance_media"):
+      item = playlist.next()
+      if item is None:
+        if media_path is not None:
+          print("No content matches the filter keys.")
+        media_type, media_path = None, None
+        return False
       
-      # Allow all photos with no contents
-      if not contents:
-        return True
+      media_type, media_path = item
+      print(f"Advancing to {media_type} {media_path}")
+      prefetcher.refresh()
+      return True
+  
+  def go_back():
+    nonlocal media_type, media_path
+    
+    item = playlist.previous()
+    if item is None:
+      print("Nothing earlier in the history")
+      return False
+    
+    media_type, media_path = item
+    print(f"Going back to {media_type} {media_path}")
+    prefetcher.refresh()
+    return True
+  
+  # Current image plus the images that will follow it, minus those still decoded in the recent cache
+  def get_upcoming_images():
+    upcoming = [media_path] if media_type == "image" else []
+    for _, path in playlist.peek(PREFETCH_DEPTH, "image"):
+      if path not in upcoming:
+        upcoming.append(path)
+    return [path for path in upcoming if path not in recent_items]
+  
+  # Decoded photo for the current item: from the recent cache when it is still there, e.g. reached through the history
+  # or shown again, otherwise from the prefetcher, decoding it now as a last resort
+  def get_prepared_image(path):
+    # The stats measure stepping back through the history, items shown again going forward are not counted
+    prepared = recent_items.get(path, count=playlist.from_history)
+    if playlist.from_history:
+      stats = recent_items.get_stats()
+      print(f"Recent cache {'hit' if prepared else 'miss'} for {path}: {stats['hits']} hits, {stats['misses']} misses")
+    prepared = prepared or prefetcher.take(path) or load_prepared_image(resolve_photo_path(path), screen)
+    if prepared:
+      recent_items.put(path, prepared)
+    return prepared
+  
+  prefetcher = MediaPrefetcher(lambda path: load_prepared_image(resolve_photo_path(path), screen), get_upcoming_images, PREFETCH_DEPTH)
+  
+  def add_new_filter_keys():
+    for key in get_unique_content_keys(metadata):
+      if key not in FILTER_KEYS:
+        FILTER_KEYS[key] = True
+        add_filter_checkbox(key)
+  
+  # A single file finished downloading during a sync
+  def add_downloaded_media(path, file_metadata):
+    downloaded_type = get_media_type(path)
+    if not downloaded_type:
+      return
+    if file_metadata:
+      metadata[path] = file_metadata
+      add_new_filter_keys()
+    index_media(metadata, path)
+    playlist.add(downloaded_type, path)
+    # A re-uploaded file may have come back with different tags and pixels
+    playlist.refresh_item(path)
+    recent_items.discard(path)
+  
+  # Merge finished background syncs into the live playlist, between items
+  def apply_sync_results():
+    for result in sync_worker.poll():
+      if "downloaded" in result:
+        add_downloaded_media(result["downloaded"], result["metadata"])
+        continue
       
-      content_list = contents.split(",") # ["dog", "cat", "beach"]
+      latest = [("image", img) for img in result["images"]] + [("video", vid) for vid in result["videos"]]
+      latest_paths = {path for _, path in latest}
+      added = [item for item in latest if item[1] not in playlist.items]
+      removed = [path for path in playlist.items if path not in latest_paths]
+      print(f"Sync finished: {len(added)} added, {len(removed)} removed")
       
-      # Check if any content keys are filtered out
-      content_filtered_out = False
-      for content in content_list:
-        if content in FILTER_KEYS and FILTER_KEYS[content] == False:
-          content_filtered_out = True
-          break
+      for path in removed:
+        playlist.remove(path)
+        tag_index.remove_item(path)
+        recent_items.discard(path)
       
-      if content_filtered_out:
-        if check_any_content_matches(metadata, content_order, FILTER_KEYS):
-          return advance_media()
-        else:
-          print("No more content matches the filter keys.")
+      # Only re-index items whose tags changed
+      previous_metadata = dict(metadata)
+      metadata.clear()
+      metadata.update(result["metadata"])
+      add_new_filter_keys()
+      for path in playlist.items:
+        if previous_metadata.get(path) != metadata.get(path):
+          index_media(metadata, path)
+          playlist.refresh_item(path)
+      
+      # New items join the part of the cycle that has not played yet
+      for added_type, path in added:
+        index_media(metadata, path)
+        playlist.add(added_type, path)
+      
+      # Skip past the item on screen if its file was removed
+      if media_path in removed:
+        advance_media()
+      prefetcher.invalidate()
   
-    return True
+  sync_worker = SyncWorker(run_sync, SYNC_INTERVAL, initial_delay=0)
+  sync_worker.start()
+
+  add_gauge("text_cache", get_text_cache_stats)
+  add_gauge("playlist", lambda: {"items": len(playlist.items), "allowed": tag_index.allowed_count, "history": len(playlist.history)})
+  add_gauge("recent_items", recent_items.get_stats)
+  if not isinstance(screen, pygame.Surface):
+    add_gauge("render_backend", screen.get_stats)
+  start_metrics_export()
   
   def handle_keypress(eventType, eventKey, event=None):
     global UI_VISIBLE, UI_LAST_VISIBLE, config
@@ -293,26 +484,39 @@ def main():
         return True
       
       # Check button collision
+      handled = False
       for button in buttons:
-          button.handle_event(event)
+          handled = button.handle_event(event) or handled
       
       # Check button collision
       for checkbox in checkboxes:
-          checkbox.handle_event(event)
+          handled = checkbox.handle_event(event) or handled
+      
+      # Handle tap left side, buttons and checkboxes in that area take priority
+      if not handled and mouse_x <= SCREEN_SIZES[SCREEN_SIZE][0] * LEFT_TAP_AREA:
+        print("Tapped left side")
+        if go_back():
+          triggered_button_event = True
+          return True
         
     if eventType == QUIT:
       print("Exiting...")
-      pygame.quit()
+      close_display(screen)
       sys.exit()
     if eventType == KEYDOWN:
       if eventKey == K_ESCAPE:
-        pygame.quit()
+        close_display(screen)
         sys.exit()
       elif eventKey == K_RIGHT:
         print("Next media")
         advance_media()
         triggered_button_event = True
         return True
+      elif eventKey == K_LEFT:
+        print("Previous media")
+        if go_back():
+          triggered_button_event = True
+          return True
   
   print("Starting main loop...")
   advance_media()
@@ -324,21 +528,41 @@ def main():
       config = {
         "ENABLE_SLIDESHOW": ENABLE_SLIDESHOW,
         "ENABLE_TRANSITION": ENABLE_TRANSITION,
-        "SCREEN_SIZE": SCREEN_SIZES[SCREEN_SIZE]
+        "SCREEN_SIZE": SCREEN_SIZES[SCREEN_SIZE],
+        "PHOTO_FPS": PHOTO_FPS
       }
       
       display_splash(screen)
+      apply_sync_results()
 
       if media_type == "image" and media_path:
-        display_photo(screen, clock, media_path, config, handle_keypress, draw)
+        display_photo(screen, clock, resolve_photo_path(media_path), config, handle_keypress, draw_media_frame, get_prepared_image(media_path), handoff)
       elif media_type == "video" and media_path:
-        play_video(screen, clock, media_path, config, handle_keypress, draw)
+        play_video(screen, clock, resolve_video_path(media_path), config, handle_keypress, draw_media_frame, handoff)
+      else:
+        # Nothing to show until a sync brings in media, keep the UI responsive meanwhile
+        screen.fill((0, 0, 0))
+        ui_deadline = draw(screen)
+        present(screen)
+        # Sleep until input, a UI change, or the next check for new media a second from now
+        now = time.time()
+        animating = ui_deadline is not None and ui_deadline <= now
+        for event in idle_scheduler.wait(animating, min(now + 1, ui_deadline or now + 1)):
+          handle_keypress(event.type, getattr(event, "key", None), event)
+        # The next item appears without a fade, its handoff is measured from the last idle frame
+        handoff.finish(screen)
+        advance_media()
+        continue
 
       if ENABLE_SLIDESHOW and not triggered_button_event:
         advance_media()
     except SystemExit:
       running = False
-      pygame.quit()
+      sync_worker.stop()
+      shutdown_builds()
+      prefetcher.shutdown()
+      stop_metrics_export()
+      close_display(screen)
       sys.exit()
     except Exception as e:
       print(f"Exception: {e}")
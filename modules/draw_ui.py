@@ -4,11 +4,19 @@ import time
 import os
 import random
 from utils.loadsvgs import load_svg_as_surface
+from utils.fonts import get_font
+from utils.display import to_display_format
+from classes.fadetimeline import FadeTimeline
 from modules.photo_display import get_scaled_rect, scale_image
 from dotenv import load_dotenv
 
 load_dotenv()
 
+UI_FONT_SIZE = 36
+SPLASH_FONT_SIZE = 72
+FIRST_RUN_FONT_SIZE = 48
+UI_HIDE_DELAY = 5  # seconds the UI stays up after the last interaction
+
 def draw_transparent_rect(screen, rect, color, alpha):
     # Create a new surface with the same dimensions as the rectangle
     temp_surface = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
@@ -45,23 +53,21 @@ def draw_filter_checklist(screen, font, filter_keys, toggle_filter_key):
     if mouse_click[0] and checkbox_rect.collidepoint(mouse_x, mouse_y):
       toggle_filter_key(key)
 
-def draw_ui(screen, buttons, checkboxes, ui_state, screen_size, right_tap_area, loaded_icons, filter_keys, toggle_filter_key):
-    # Hide the UI after 5 seconds
-    if ui_state['UI_LAST_VISIBLE'] and time.time() - ui_state['UI_LAST_VISIBLE'] > 5:
-        ui_state['UI_VISIBLE'] = False
+# The overlay is drawn once into an alpha surface and reused until the UI state it shows changes
+overlay_cache = {
+    "key": None,
+    "surface": None,
+    "rect": None
+}
 
-    if not ui_state['UI_VISIBLE']:
-        return
-
-    font = pygame.font.Font(None, 36)
-    transition_text = "Transitions: On" if ui_state['ENABLE_TRANSITION'] else "Transitions: Off"
-    buttons[1].text = transition_text
+def render_ui_overlay(buttons, checkboxes, ui_state, screen_size, right_tap_area, loaded_icons, filter_keys):
+    overlay = pygame.Surface(screen_size, pygame.SRCALPHA)
 
     for button in buttons:
-        button.draw(screen, font)
+        button.draw(overlay, UI_FONT_SIZE)
         
     for checkbox in checkboxes:
-        checkbox.draw(screen, font, filter_keys[checkbox.key])
+        checkbox.draw(overlay, UI_FONT_SIZE, filter_keys[checkbox.key])
 
     # Draw right side tap area
     rect = pygame.Rect(
@@ -72,18 +78,50 @@ def draw_ui(screen, buttons, checkboxes, ui_state, screen_size, right_tap_area,
     )
     color = (0, 0, 0)  # Black
     alpha = 128  # 50% transparency
-    draw_transparent_rect(screen, rect, color, alpha)
+    draw_transparent_rect(overlay, rect, color, alpha)
 
     # Icons
-    draw_icon(screen, loaded_icons.get("skip"), (screen_size[0] - screen_size[0] * right_tap_area + 36, screen_size[1] / 2 - 24))
-    draw_icon(screen, loaded_icons.get("play" if ui_state['ENABLE_SLIDESHOW'] else "pause"), (24, screen_size[1] - 72))
+    draw_icon(overlay, loaded_icons.get("skip"), (screen_size[0] - screen_size[0] * right_tap_area + 36, screen_size[1] / 2 - 24))
+    draw_icon(overlay, loaded_icons.get("play" if ui_state['ENABLE_SLIDESHOW'] else "pause"), (24, screen_size[1] - 72))
+    return overlay
+
+def draw_ui(screen, buttons, checkboxes, ui_state, screen_size, right_tap_area, loaded_icons, filter_keys, toggle_filter_key):
+    """Draw the overlay if visible. Returns the time it will hide, or None if it is hidden."""
+    # Hide the UI after 5 seconds
+    if ui_state['UI_LAST_VISIBLE'] and time.time() - ui_state['UI_LAST_VISIBLE'] > UI_HIDE_DELAY:
+        ui_state['UI_VISIBLE'] = False
+
+    if not ui_state['UI_VISIBLE']:
+        return None
+
+    transition_text = "Transitions: On" if ui_state['ENABLE_TRANSITION'] else "Transitions: Off"
+    buttons[1].text = transition_text
+
+    # Regenerate only when something the overlay shows has changed
+    key = (
+        ui_state['ENABLE_SLIDESHOW'],
+        ui_state['ENABLE_TRANSITION'],
+        tuple(filter_keys.items()),
+        tuple(checkbox.key for checkbox in checkboxes),
+        tuple(screen_size),
+        tuple(id(icon) for icon in loaded_icons.values())
+    )
+    if key != overlay_cache["key"]:
+        overlay = render_ui_overlay(buttons, checkboxes, ui_state, screen_size, right_tap_area, loaded_icons, filter_keys)
+        # Only the area that has something drawn on it needs to be blitted
+        overlay_cache["rect"] = overlay.get_bounding_rect()
+        overlay_cache["surface"] = overlay.subsurface(overlay_cache["rect"])
+        overlay_cache["key"] = key
+
+    screen.blit(overlay_cache["surface"], overlay_cache["rect"])
+    return ui_state['UI_LAST_VISIBLE'] + UI_HIDE_DELAY if ui_state['UI_LAST_VISIBLE'] else None
 
 def preload_splash_image(splash_image_path, screen_size):
     """
     Load and scale the splash image to fill the screen while maintaining aspect ratio.
     If necessary, crop the image to remove black bars.
     """
-    splash_image = pygame.image.load(splash_image_path).convert()
+    splash_image = to_display_format(pygame.image.load(splash_image_path))
     image_width, image_height = splash_image.get_size()
     screen_width, screen_height = screen_size
 
@@ -111,32 +149,36 @@ def preload_splash_image(splash_image_path, screen_size):
 
     return cropped_image
 
-def show_splash_overlay(screen, splash_image, start_time, duration=7, fade_duration=4):
+# Timelines are built on the first frame of each sequence and reused until it ends
+timelines = {}
+
+def get_text_layer(text, size, color):
+    # Rendered outside the shared text cache, the timeline owns it and changes its alpha
+    return get_font(size).render(text, True, color)
+
+def build_splash_timeline(screen, splash_image, start_time, duration, fade_duration):
   text = os.getenv("SPLASH_MESSAGE")
   if not text:
     text = "EPIPhoto Frame"
-  elapsed = time.time() - start_time
-  alpha = 255
-  if elapsed > duration + fade_duration:
-    return False  # Splash duration has ended
 
-  if elapsed <= duration:
-    screen.blit(splash_image, (0, 0))
-  else:
-    alpha = max(0, 255 - int(255 * (elapsed - duration) / fade_duration))
-    temp_surface = splash_image.copy()
-    temp_surface.set_alpha(alpha)
-    screen.blit(temp_surface, (0, 0))
-
-  font = pygame.font.Font(None, 72)
-  text_surface = font.render(text, True, (255, 255, 255))
-  text_surface.set_alpha(alpha)
+  timeline = FadeTimeline(start_time)
+  # The splash folder is empty until the first sync has downloaded one
+  timeline.add_layer(splash_image, (0, 0), 0, duration, fade_duration)
+  text_surface = get_text_layer(text, SPLASH_FONT_SIZE, (255, 255, 255))
   text_rect = text_surface.get_rect(center=(screen.get_width() // 2, screen.get_height() // 2))
-  screen.blit(text_surface, text_rect)
+  timeline.add_layer(text_surface, text_rect, 0, duration, fade_duration)
+  return timeline
 
+def show_splash_overlay(screen, splash_image, start_time, duration=7, fade_duration=4):
+  key = ("splash", start_time)
+  if key not in timelines:
+    timelines[key] = build_splash_timeline(screen, splash_image, start_time, duration, fade_duration)
+
+  if not timelines[key].draw(screen):
+    return False  # Splash duration has ended
   return True  # Splash is still active
-  
-def show_first_run(screen, splash_image, start_time):
+
+def build_first_run_timeline(screen, splash_image, start_time):
     # Text content
     text1 = "Welcome to the EPIPhoto Frame!"
     text2 = "Tap the bottom of the screen to open the UI."
@@ -145,8 +187,7 @@ def show_first_run(screen, splash_image, start_time):
     if not text4:
         text4 = "Enjoy your memories!"
 
-    # Font and colors
-    font = pygame.font.Font(None, 48)
+    # Colors
     text_color = (255, 255, 255)
     
     # Timing configuration (in seconds)
@@ -154,95 +195,38 @@ def show_first_run(screen, splash_image, start_time):
     fade_out_123 = 2.0      # fade out time for first three texts
     phase3_duration = 10.0  # time to show text4 and image
     fade_out_4 = 2.0        # fade out time for text4 and image
-
-    # Calculate elapsed time
-    elapsed = time.time() - start_time
     
     # Calculate phase boundaries
-    phase1_end = phase1_duration           # 5s
-    phase2_end = phase1_end + fade_out_123 # 6s
-    phase3_end = phase2_end + phase3_duration # 16s
-    phase4_end = phase3_end + fade_out_4   # 18s total
-    
+    phase1_end = phase1_duration           # 10s
+    phase2_end = phase1_end + fade_out_123 # 12s
+    phase3_end = phase2_end + phase3_duration # 22s
+
+    timeline = FadeTimeline(start_time, background=(0, 0, 0))
+
+    # Phase 3 and 4: splash fully visible, then fading out
+    timeline.add_layer(splash_image, (0, 0), phase2_end, phase3_end, fade_out_4)
+
+    # Phase 1: Show texts 1,2,3 in sequence at 1s, 5s and 8s
+    # Then fade out these three texts in phase 2
+    y_pos = screen.get_height() // 2 - 50
+    line_spacing = 60
+    for i, (text, show_at) in enumerate([(text1, 1.0), (text2, 5.0), (text3, 8.0)]):
+        surface = get_text_layer(text, FIRST_RUN_FONT_SIZE, text_color)
+        rect = surface.get_rect(center=(screen.get_width()//2, y_pos + i * line_spacing))
+        timeline.add_layer(surface, rect, show_at, phase1_end, fade_out_123)
+
+    # Phase 3 and 4: Show text4 at the top
+    surface4 = get_text_layer(text4, FIRST_RUN_FONT_SIZE, text_color)
+    rect4 = surface4.get_rect(center=(screen.get_width()//2, 50))
+    timeline.add_layer(surface4, rect4, phase2_end, phase3_end, fade_out_4)
+    return timeline
+  
+def show_first_run(screen, splash_image, start_time):
+    key = ("first_run", start_time)
+    if key not in timelines:
+        timelines[key] = build_first_run_timeline(screen, splash_image, start_time)
+
     # If we've exceeded the entire sequence time, return False
-    if elapsed > phase4_end:
+    if not timelines[key].draw(screen):
         return False
-
-    # Clear screen
-    screen.fill((0,0,0))
-
-    if elapsed < phase2_end:
-        # During phases 1 and 2, do not show splash 
-        splash_alpha = 0
-    elif elapsed < phase3_end:
-        # Phase 3: splash fully visible
-        splash_alpha = 255
-    else:
-        # Phase 4: fade out splash
-        fade_elapsed = elapsed - phase3_end
-        fade_fraction = fade_elapsed / fade_out_4
-        splash_alpha = max(0, 255 - int(255 * fade_fraction))
-    
-    # Draw the splash image with the calculated alpha
-    splash_surface = splash_image.copy()
-    splash_surface.set_alpha(splash_alpha)
-    screen.blit(splash_surface, (0, 0))
-
-    # Phase 1: Show texts 1,2,3 in sequence
-    # 0-1s: text1
-    # 1-2s: text1, text2
-    # 2-5s: text1, text2, text3
-    # Then 5-6s fade out these three texts
-    if elapsed < phase2_end:
-        # Determine alpha for texts 1-3 based on whether we are in fade-out period
-        if elapsed < phase1_end:
-            # Before 5s: texts fully opaque
-            alpha_123 = 255
-        else:
-            # In the fade-out window from 5s to 6s
-            fade_fraction = (elapsed - phase1_end) / fade_out_123
-            alpha_123 = max(0, 255 - int(255 * fade_fraction))
-
-        # Conditions to show each text
-        show_text1 = (elapsed >= 1.0)
-        show_text2 = (elapsed >= 5.0)
-        show_text3 = (elapsed >= 8.0)
-
-        y_pos = screen.get_height() // 2 - 50
-        line_spacing = 60
-
-        if show_text1:
-            surf1 = font.render(text1, True, text_color)
-            surf1.set_alpha(alpha_123)
-            rect1 = surf1.get_rect(center=(screen.get_width()//2, y_pos))
-            screen.blit(surf1, rect1)
-
-        if show_text2:
-            surf2 = font.render(text2, True, text_color)
-            surf2.set_alpha(alpha_123)
-            rect2 = surf2.get_rect(center=(screen.get_width()//2, y_pos + line_spacing))
-            screen.blit(surf2, rect2)
-
-        if show_text3:
-            surf3 = font.render(text3, True, text_color)
-            surf3.set_alpha(alpha_123)
-            rect3 = surf3.get_rect(center=(screen.get_width()//2, y_pos + 2*line_spacing))
-            screen.blit(surf3, rect3)
-
-    else:
-        # Phase 3 and 4: Show text4 centered
-        if elapsed < phase3_end:
-            # text4 fully visible
-            alpha_4 = 255
-        else:
-            # fading out text4
-            fade_elapsed = elapsed - phase3_end
-            fade_fraction = fade_elapsed / fade_out_4
-            alpha_4 = max(0, 255 - int(255 * fade_fraction))
-
-        surf4 = font.render(text4, True, text_color)
-        surf4.set_alpha(alpha_4)
-        rect4 = surf4.get_rect(center=(screen.get_width()//2, 50))
-        screen.blit(surf4, rect4)
-    
-    return True
\ No newline at end of file
+    return True
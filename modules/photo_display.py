@@ -4,20 +4,41 @@ import os
 import time
 import random
 
+from PIL import Image
 from pygame.locals import * # type: ignore
+from classes.renderscheduler import RenderScheduler
+from utils.display import present, blit_scaled, to_display_format
+from utils.metrics import timed, record_frame
 
 ZOOM_DURATION = 10  # in seconds
 TRANSLATE_DURATION = 10  # in seconds
-
-def load_image(image_path):
+ZOOM_AMOUNT = 0.1  # zoom grows from 1.0 to 1.0 + ZOOM_AMOUNT
+MAX_ZOOM = 1.2  # largest scale any effect draws the image at, relative to start_rect
+DEFAULT_FPS = 60
+
+def load_image(image_path, screen_size=None):
+  """
+  Decode a photo into a display format surface.
+  With a screen_size, JPEGs are decoded at the smallest DCT scale (1/2, 1/4, 1/8) that still
+  covers the screen at MAX_ZOOM, so a 24 MP file never has to be decoded in full.
+  Other formats fall back to a full decode.
+  """
   if not os.path.exists(image_path):
     print(f"Error: Image '{image_path}' not found.")
     sys.exit(1)
-  return pygame.image.load(image_path).convert()
-
-def get_scaled_rect(image, screen):
-  img_width, img_height = image.get_size()
-  screen_width, screen_height = screen.get_size()
+  if screen_size:
+    with Image.open(image_path) as pil_image:
+      if pil_image.format == "JPEG":
+        decode_width, decode_height = get_cover_size(pil_image.size, screen_size)
+        pil_image.draft("RGB", (int(decode_width * MAX_ZOOM), int(decode_height * MAX_ZOOM)))
+        rgb_image = pil_image.convert("RGB")
+        return to_display_format(pygame.image.frombuffer(rgb_image.tobytes(), rgb_image.size, "RGB"))
+  return to_display_format(pygame.image.load(image_path))
+
+def get_cover_size(image_size, screen_size):
+  """Size the image is scaled to so it fills the screen while keeping its aspect ratio."""
+  img_width, img_height = image_size
+  screen_width, screen_height = screen_size
   img_aspect = img_width / img_height
   screen_aspect = screen_width / screen_height
 
@@ -27,12 +48,17 @@ def get_scaled_rect(image, screen):
   else:
     scale_width = screen_width
     scale_height = int(scale_width / img_aspect)
+  return scale_width, scale_height
+
+def get_scaled_rect(image, screen):
+  scale_width, scale_height = get_cover_size(image.get_size(), screen.get_size())
+  screen_width, screen_height = screen.get_size()
 
   scaled_rect = pygame.Rect(0, 0, scale_width, scale_height)
   scaled_rect.center = (screen_width // 2, screen_height // 2)
   return scaled_rect
 
-def scale_image(image, start_rect, zoom_factor=1.2):
+def scale_image(image, start_rect, zoom_factor=MAX_ZOOM):
   zoom_width = int(start_rect.width * zoom_factor)
   zoom_height = int(start_rect.height * zoom_factor)
   zoomed_rect = pygame.Rect(0, 0, zoom_width, zoom_height)
@@ -41,80 +67,155 @@ def scale_image(image, start_rect, zoom_factor=1.2):
   
   return zoomed_image, zoomed_rect
 
-def zoom_image(image, start_rect, zoom_factor, screen, enable_effects):
-  if (not enable_effects):
-    zoomed_image, zoomed_rect = scale_image(image, start_rect)
-    return zoomed_image, zoomed_rect
-  else:
-    zoomed_image, zoomed_rect = scale_image(image, start_rect, zoom_factor)
+def prepare_image(image, screen):
+  """
+  Downsample a decoded photo once to the working buffer used by the effects.
+  The buffer is start_rect * MAX_ZOOM, the largest extent any zoom or pan frame needs,
+  so every frame after this is a crop or a small-ratio scale of the buffer.
+  """
+  start_rect = get_scaled_rect(image, screen)
+  buffer, buffer_rect = scale_image(image, start_rect)
+  return buffer, buffer_rect, start_rect
+
+def load_prepared_image(image_path, screen):
+  """
+  Decode and pre-scale a photo. Safe to call from a prefetch worker thread.
+  Returns None if the file is missing or unreadable, e.g. a sync removed it in the meantime.
+  """
+  if not os.path.exists(image_path):
+    print(f"Error: Image '{image_path}' not found.")
+    return None
+  try:
+    with timed("photo.decode"):
+      image = load_image(image_path, screen.get_size())
+    with timed("photo.prepare"):
+      return prepare_image(image, screen)
+  except (pygame.error, OSError, ValueError) as e:
+    print(f"Error: Could not load image '{image_path}': {e}")
+    return None
+
+def zoom_image(buffer, buffer_rect, start_rect, zoom_factor, screen):
+  """Returns the region of the buffer visible at zoom_factor and the screen rect it is drawn stretched over."""
+  # Rect of the image at zoom_factor, as scaling the original would produce
+  zoomed_rect = pygame.Rect(0, 0, int(start_rect.width * zoom_factor), int(start_rect.height * zoom_factor))
+  zoomed_rect.center = start_rect.center
 
   # Ensure the zoomed_rect stays centered relative to the screen
   screen_rect = screen.get_rect()
   cropped_rect = zoomed_rect.clip(screen_rect)
   cropped_rect.center = screen_rect.center
-  cropped_image = zoomed_image.subsurface(cropped_rect)
 
-  return cropped_image, cropped_rect
+  # Map the visible crop back into buffer coordinates and only scale that region
+  ratio_x = buffer_rect.width / zoomed_rect.width
+  ratio_y = buffer_rect.height / zoomed_rect.height
+  source_rect = pygame.Rect(
+    round(cropped_rect.x * ratio_x),
+    round(cropped_rect.y * ratio_y),
+    round(cropped_rect.width * ratio_x),
+    round(cropped_rect.height * ratio_y)
+  ).clip(buffer.get_rect())
+
+  return source_rect, cropped_rect
 
-def translate_image(image, start_rect, translate_factor, direction, enable_effects):
-  scaled_image, scaled_rect = scale_image(image, start_rect)
+def translate_image(buffer, buffer_rect, start_rect, translate_factor, direction, enable_effects):
   if (not enable_effects):
-    return scaled_image, scaled_rect
+    return buffer, buffer_rect
   
   # Apply translation
-  translate_offset = int((scaled_rect.width - start_rect.width) * translate_factor)
-  translated_rect = scaled_rect.copy()
+  translate_offset = int((buffer_rect.width - start_rect.width) * translate_factor)
+  translated_rect = buffer_rect.copy()
     
   if direction == "left":
     translated_rect.x = -translate_offset
   elif direction == "right":
-    translated_rect.x = translate_offset - (scaled_rect.width - start_rect.width)
+    translated_rect.x = translate_offset - (buffer_rect.width - start_rect.width)
       
-  return scaled_image, translated_rect
-
-def display_photo(screen, clock, image_path, config, handle_keypress, draw_ui):
-  image = load_image(image_path)
-  start_rect = get_scaled_rect(image, screen)
+  return buffer, translated_rect
+
+def draw_photo_frame(target, prepared, effect_type, direction, elapsed_time, enable_effects):
+  """Draw the photo as its effect looks elapsed_time into the item, onto the screen or a plain Surface."""
+  buffer, buffer_rect, start_rect = prepared
+  target.fill((0, 0, 0))
+  if effect_type == "zoom":
+    if enable_effects:
+      zoom_factor = 1 + (elapsed_time / ZOOM_DURATION) * ZOOM_AMOUNT
+      source_rect, zoomed_rect = zoom_image(buffer, buffer_rect, start_rect, zoom_factor, target)
+      blit_scaled(target, buffer, source_rect, zoomed_rect)
+    else:
+      target.blit(buffer, buffer_rect)
+
+  elif effect_type == "translate":
+    translate_factor = (elapsed_time / TRANSLATE_DURATION)
+    translated_image, translated_rect = translate_image(buffer, buffer_rect, start_rect, translate_factor, direction, enable_effects)
+    target.blit(translated_image, translated_rect)
+
+def display_photo(screen, clock, image_path, config, handle_keypress, draw_ui, prepared=None, handoff=None):
+  # Use the prefetched buffer when there is one, otherwise decode now
+  if prepared is None:
+    prepared = load_prepared_image(image_path, screen)
+    if prepared is None:
+      return
+  target_fps = config.get("PHOTO_FPS", DEFAULT_FPS)
+  scheduler = RenderScheduler(clock, target_fps)
   start_time = time.time()
+  frame_count = 0
 
   # Randomly choose between zoom or translate
   effect_type = random.choice(["zoom", "translate"])
   direction = random.choice(["left", "right"]) if effect_type == "translate" else ""
-
-  while True:
-    elapsed_time = time.time() - start_time
-
-    if effect_type == "zoom":
-      zoom_factor = 1 + (elapsed_time / ZOOM_DURATION) * 0.1
-      if elapsed_time >= ZOOM_DURATION:
-        break
-      # Zoom and draw image
-      zoomed_image, zoomed_rect = zoom_image(image, start_rect, zoom_factor, screen, config["ENABLE_TRANSITION"])
-      screen.fill((0, 0, 0))
-      screen.blit(zoomed_image, zoomed_rect)
-
-    elif effect_type == "translate":
-      translate_factor = (elapsed_time / TRANSLATE_DURATION)
-      if elapsed_time >= TRANSLATE_DURATION:
+  duration = ZOOM_DURATION if effect_type == "zoom" else TRANSLATE_DURATION
+  end_time = start_time + duration
+
+  redraw = True
+  ui_deadline = None
+  elapsed_time = 0
+  try:
+    while True:
+      now = time.time()
+      elapsed_time = now - start_time
+      if elapsed_time >= duration:
         break
-      translated_image, translated_rect = translate_image(image, start_rect, translate_factor, direction, config["ENABLE_TRANSITION"])
-      screen.fill((0, 0, 0))
-      screen.blit(translated_image, translated_rect)
-   
-    # UI Draw
-    draw_ui(screen)
-    pygame.display.flip()
-    
-    for event in pygame.event.get():
-      # print(event)
-      cancel_loop = False
-      if hasattr(event, "key"):
-        cancel_loop = handle_keypress(event.type, event.key)
-      else:
-        cancel_loop = handle_keypress(event, None, event)
+
+      if redraw:
+        frame_start = time.perf_counter()
+        with timed("photo.effect"):
+          draw_photo_frame(screen, prepared, effect_type, direction, elapsed_time, config["ENABLE_TRANSITION"])
+          # Fade the previous item out over the first frames
+          if handoff:
+            handoff.draw(screen)
+       
+        # UI Draw, returns when the UI next needs a redraw (None if it is static)
+        with timed("photo.ui"):
+          ui_deadline = draw_ui(screen)
+        with timed("photo.present"):
+          present(screen)
+        record_frame("photo.frame", time.perf_counter() - frame_start, 1 / target_fps)
+        frame_count += 1
       
-      # Exit the dispaly loop if cancel_loop is True
-      if cancel_loop:
-        return
+      # Only keep redrawing while the effect or the UI is moving, otherwise sleep until input or a deadline
+      animating = config["ENABLE_TRANSITION"] or (ui_deadline is not None and ui_deadline <= now)
+      deadline = min(end_time, ui_deadline) if ui_deadline is not None else end_time
+      events = scheduler.wait(animating, deadline)
       
-    clock.tick(60)
\ No newline at end of file
+      for event in events:
+        # print(event)
+        cancel_loop = False
+        if hasattr(event, "key"):
+          cancel_loop = handle_keypress(event.type, event.key)
+        else:
+          cancel_loop = handle_keypress(event, None, event)
+        
+        # Exit the dispaly loop if cancel_loop is True
+        if cancel_loop:
+          return
+      redraw = animating or bool(events) or time.time() >= deadline
+
+    measured_fps = frame_count / max(time.time() - start_time, 0.001)
+    print(f"Photo {effect_type} drew {frame_count} frames, {measured_fps:.1f} fps (cap {target_fps})")
+  finally:
+    # Keep the last frame so the next item can crossfade from it
+    if handoff and config["ENABLE_TRANSITION"]:
+      last_elapsed = min(elapsed_time, duration)
+      handoff.finish(screen, lambda surface: draw_photo_frame(surface, prepared, effect_type, direction, last_elapsed, True))
+    elif handoff:
+      handoff.finish(screen)
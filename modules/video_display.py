@@ -1,48 +1,72 @@
 import os
-import cv2 # type: ignore
-import sys
+import time
 import pygame
 from pygame.locals import * # type: ignore
+from utils.display import present, refresh_surface
+from utils.metrics import timed, record_frame
 
-def play_video(screen, clock, video_path, config, handle_keypress, draw_ui):
+def play_video(screen, clock, video_path, config, handle_keypress, draw_ui, handoff=None):
+  # Videos can disappear while the frame runs when a background sync removes them
   if not os.path.exists(video_path):
     print(f"Error: Video '{video_path}' not found.")
-    sys.exit(1)
+    return
 
-  cap = cv2.VideoCapture(video_path)
-  while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-      break
-    
-    frame = cv2.resize(frame, config["SCREEN_SIZE"])
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
+  # Imported on first use, so cv2 is not loaded until the first video plays
+  from classes.videodecoder import VideoDecoder
+  decoder = VideoDecoder(video_path, config["SCREEN_SIZE"])
+  decoder.start()
+  frame_surface = None
+  try:
+    while not decoder.finished:
+      # Waits until the next frame is due; None means keep showing the last one
+      with timed("video.next_frame"):
+        next_surface = decoder.next_frame()
 
-    screen.fill((0, 0, 0))
-    screen.blit(frame, (0, 0))
-    
-    # UI Draw
-    draw_ui(screen)
-    pygame.display.flip()
+      frame_start = time.perf_counter()
+      if next_surface:
+        # The decoder refills its frame buffers in place, the SDL2 backends have to upload them again
+        with timed("video.upload"):
+          refresh_surface(screen, next_surface)
+        frame_surface = next_surface
 
-    for event in pygame.event.get():
-      if event.type == QUIT:
-        cap.release()
-      elif event.type == KEYDOWN and event.key == K_ESCAPE:
-        cap.release()
+      with timed("video.blit"):
+        screen.fill((0, 0, 0))
+        if frame_surface:
+          screen.blit(frame_surface, decoder.frame_rect)
+        # Hold the previous item until the first frame is decoded, then fade it out
+        if handoff:
+          handoff.draw(screen, ready=frame_surface is not None)
       
-      cancel_loop = False
-      if hasattr(event, "key"):
-        cancel_loop = handle_keypress(event.type, event.key)
-      else:
-        cancel_loop = handle_keypress(event, None, event)
-      
-      # Exit the dispaly loop if cancel_loop is True
-      if cancel_loop:
-        return
-    
-    
-    clock.tick(30)
+      # UI Draw
+      with timed("video.ui"):
+        draw_ui(screen)
+      with timed("video.present"):
+        present(screen)
+      record_frame("video.frame", time.perf_counter() - frame_start, decoder.frame_duration)
 
-  cap.release()
+      for event in pygame.event.get():
+        if event.type == QUIT:
+          decoder.stop()
+        elif event.type == KEYDOWN and event.key == K_ESCAPE:
+          decoder.stop()
+        
+        cancel_loop = False
+        if hasattr(event, "key"):
+          cancel_loop = handle_keypress(event.type, event.key)
+        else:
+          cancel_loop = handle_keypress(event, None, event)
+        
+        # Exit the dispaly loop if cancel_loop is True
+        if cancel_loop:
+          return
+      
+      # Pacing comes from the frame timestamps, this only keeps the clock's fps stats current
+      clock.tick()
+  finally:
+    decoder.stop()
+    # Keep the last frame so the next item can crossfade from it
+    if handoff and config["ENABLE_TRANSITION"] and frame_surface:
+      handoff.finish(screen, lambda surface: surface.blit(frame_surface, decoder.frame_rect))
+    elif handoff:
+      handoff.finish(screen)
+    print(f"Video {video_path} at {decoder.fps:.2f} fps: {decoder.presented_frames} shown, {decoder.dropped_frames} dropped, {decoder.late_frames} late")
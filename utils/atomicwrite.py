@@ -0,0 +1,14 @@
+import os
+import json
+
+def write_json_atomic(path, data, indent=4):
+  """Write data as JSON next to path and rename it into place, so readers and crashes never see a truncated file."""
+  temp_path = path + ".tmp"
+  try:
+    with open(temp_path, "w") as temp_file:
+      json.dump(data, temp_file, indent=indent)
+    os.replace(temp_path, path)
+  except Exception:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
@@ -0,0 +1,83 @@
+import os
+import pygame
+
+# "software" blits surfaces onto the display surface (the default).
+# "sdl2" draws textures through an SDL2 renderer, preferring a GPU, and "sdl2-software" forces
+# SDL's software renderer, which runs anywhere and is what headless machines can test against.
+RENDER_BACKENDS = ("software", "sdl2", "sdl2-software")
+
+def create_display(size, fullscreen, backend="software", title="Digital Photo Frame"):
+  """
+  Open the window and return what the display loops draw on.
+  For the software backend that is the display surface, for the SDL2 backends a TextureCanvas.
+  """
+  if backend != "software":
+    try:
+      return create_texture_canvas(size, fullscreen, backend, title)
+    except (ImportError, ValueError, pygame.error) as e:
+      print(f"Error: Could not start the {backend} render backend, using software rendering: {e}")
+
+  if fullscreen:
+    screen = pygame.display.set_mode(size, pygame.FULLSCREEN | pygame.NOFRAME)
+  else:
+    screen = pygame.display.set_mode(size)
+  pygame.display.set_caption(title)
+  return screen
+
+def create_texture_canvas(size, fullscreen, backend, title):
+  if backend not in RENDER_BACKENDS:
+    raise ValueError(f"unknown backend, expected one of {', '.join(RENDER_BACKENDS)}")
+  from pygame._sdl2.video import Window, Renderer
+  from classes.texturecanvas import TextureCanvas
+
+  # Renderers scale with nearest neighbour unless told otherwise, zooms need linear filtering
+  os.environ.setdefault("SDL_RENDER_SCALE_QUALITY", "linear")
+  window = Window(title, size, fullscreen=fullscreen, borderless=fullscreen)
+  renderer = Renderer(window, accelerated=-1 if backend == "sdl2" else 0)
+  print(f"Rendering with the {backend} backend")
+  return TextureCanvas(renderer, size)
+
+def close_display(screen):
+  """Release what the display loops drew on and shut pygame down."""
+  if not isinstance(screen, pygame.Surface):
+    screen.close()
+  pygame.quit()
+
+def present(screen):
+  """Show the frame drawn on screen."""
+  if isinstance(screen, pygame.Surface):
+    pygame.display.flip()
+  else:
+    screen.present()
+
+def blit_scaled(screen, surface, area, dest_rect):
+  """Draw area of surface stretched over dest_rect. The SDL2 backends scale in the renderer."""
+  if not isinstance(screen, pygame.Surface):
+    screen.blit_scaled(surface, area, dest_rect)
+    return
+  region = surface.subsurface(area)
+  if region.get_size() != dest_rect.size:
+    region = pygame.transform.smoothscale(region, dest_rect.size)
+  screen.blit(region, dest_rect)
+
+def refresh_surface(screen, surface):
+  """Tell the SDL2 backends that the pixels of a surface changed in place, so its texture is uploaded again."""
+  if not isinstance(screen, pygame.Surface):
+    screen.upload(surface)
+
+def to_display_format(surface, alpha=False):
+  """
+  Convert a surface to the display pixel format for fast blits.
+  The SDL2 backends have no display surface to convert to, their texture upload converts instead.
+  Without one, palettized and greyscale images are still brought to 24 or 32 bits, since smoothscale only takes those.
+  """
+  if pygame.display.get_surface() is None:
+    if surface.get_bitsize() in (24, 32):
+      return surface
+    if alpha:
+      # convert() has no per-pixel alpha target without a display, blit onto one to keep colorkey transparency
+      converted = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+      converted.blit(surface, (0, 0))
+      return converted
+    return surface.convert(24)
+  return surface.convert_alpha() if alpha else surface.convert()
@@ -0,0 +1,44 @@
+import pygame
+from collections import OrderedDict
+
+TEXT_CACHE_SIZE = 256
+
+fonts = {}  # size -> pygame.font.Font, shared by all UI drawing
+text_cache = OrderedDict()  # (text, size, color, antialias) -> rendered Surface, least recently used first
+text_cache_stats = {
+  "hits": 0,
+  "misses": 0
+}
+
+def get_font(size):
+  font = fonts.get(size)
+  if font is None:
+    font = fonts[size] = pygame.font.Font(None, size)
+  return font
+
+def render_text(text, size, color=(255, 255, 255), antialias=True):
+  """
+  Rendered text surface from the LRU cache, rendering it on a miss.
+  The surface is shared, so callers that change its alpha must set it before every blit.
+  """
+  key = (text, size, tuple(color), antialias)
+  surface = text_cache.get(key)
+  if surface is not None:
+    text_cache.move_to_end(key)
+    text_cache_stats["hits"] += 1
+    return surface
+
+  text_cache_stats["misses"] += 1
+  surface = get_font(size).render(text, antialias, color)
+  text_cache[key] = surface
+  if len(text_cache) > TEXT_CACHE_SIZE:
+    text_cache.popitem(last=False)
+  return surface
+
+def get_text_cache_stats():
+  lookups = text_cache_stats["hits"] + text_cache_stats["misses"]
+  return {
+    **text_cache_stats,
+    "size": len(text_cache),
+    "hit_rate": text_cache_stats["hits"] / lookups if lookups else 0
+  }
@@ -0,0 +1,184 @@
+import os
+import math
+import time
+import hashlib
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from PIL import Image, ImageOps
+from modules.photo_display import get_cover_size, MAX_ZOOM
+
+DERIVATIVE_DIR = "derivatives"
+PROXY_DIR = "proxies"
+PROXY_MAX_FPS = 30
+EXIF_ORIENTATION = 0x0112
+
+active_pools = set()  # build pools of a sync in progress, cancelled by shutdown_builds()
+pools_lock = threading.Lock()
+
+def get_screen_profile(screen_size, headroom=MAX_ZOOM):
+  return f"{screen_size[0]}x{screen_size[1]}@{headroom}"
+
+def get_proxy_profile(screen_size):
+  return f"{screen_size[0]}x{screen_size[1]}@{PROXY_MAX_FPS}fps"
+
+def get_source_key(source_path):
+  # Name, size and mtime change whenever a photo is re-uploaded under the same name
+  stat = os.stat(source_path)
+  identity = f"{os.path.basename(source_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+  return hashlib.sha1(identity.encode()).hexdigest()[:16]
+
+def get_derivative_path(source_path, screen_size, headroom=MAX_ZOOM):
+  return os.path.join(DERIVATIVE_DIR, get_screen_profile(screen_size, headroom), f"{get_source_key(source_path)}.jpg")
+
+def find_derivative(source_path, screen_size, headroom=MAX_ZOOM):
+  """Return the derivative for this photo and screen if one has been built, otherwise None."""
+  try:
+    derivative_path = get_derivative_path(source_path, screen_size, headroom)
+  except OSError:
+    return None
+  return derivative_path if os.path.exists(derivative_path) else None
+
+def get_proxy_path(source_path, screen_size):
+  return os.path.join(PROXY_DIR, get_proxy_profile(screen_size), f"{get_source_key(source_path)}.avi")
+
+def find_proxy(source_path, screen_size):
+  """Return the playback proxy for this video and screen if one has been built, otherwise None."""
+  try:
+    proxy_path = get_proxy_path(source_path, screen_size)
+  except OSError:
+    return None
+  return proxy_path if os.path.exists(proxy_path) else None
+
+def build_derivative(source_path, derivative_path, screen_size, headroom=MAX_ZOOM):
+  with Image.open(source_path) as image:
+    # Work out the target size in display orientation
+    width, height = image.size
+    rotated = image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+    if rotated:
+      width, height = height, width
+    cover_width, cover_height = get_cover_size((width, height), screen_size)
+    target_size = (int(cover_width * headroom), int(cover_height * headroom))
+
+    # Let the JPEG decoder skip as much resolution as it can before we rotate and resize
+    image.draft("RGB", target_size[::-1] if rotated else target_size)
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    if image.width > target_size[0]:
+      image = image.resize(target_size, Image.Resampling.LANCZOS)
+
+    temp_path = derivative_path + ".tmp"
+    image.save(temp_path, "JPEG", quality=90)
+    os.replace(temp_path, derivative_path)
+  return derivative_path
+
+def build_proxy(source_path, proxy_path, screen_size):
+  # Imported here so cv2 only loads in the ingest workers that transcode, not at app startup
+  import cv2 # type: ignore
+  from classes.videodecoder import get_letterbox_rect
+
+  cap = cv2.VideoCapture(source_path)
+  try:
+    source_fps = cap.get(cv2.CAP_PROP_FPS)
+    # Some containers report 0 or NaN
+    if not source_fps or source_fps <= 0 or math.isnan(source_fps):
+      source_fps = PROXY_MAX_FPS
+    target_fps = min(source_fps, PROXY_MAX_FPS)
+    source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    frame_size = get_letterbox_rect(source_size, screen_size).size
+
+    # MJPEG is intra-only, so playback decodes each frame independently and cheaply.
+    # VideoWriter picks the container from the extension, so the temp file keeps .avi
+    temp_path = proxy_path + ".tmp.avi"
+    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*"MJPG"), target_fps, frame_size)
+    frame_index = 0
+    written = 0
+    while True:
+      # Only decode the frames the lower frame rate keeps
+      if int(frame_index * target_fps / source_fps) < written:
+        if not cap.grab():
+          break
+      else:
+        ret, frame = cap.read()
+        if not ret:
+          break
+        writer.write(cv2.resize(frame, frame_size, interpolation=cv2.INTER_AREA))
+        written += 1
+      frame_index += 1
+    writer.release()
+    os.replace(temp_path, proxy_path)
+  finally:
+    cap.release()
+  return proxy_path
+
+def build_cached_outputs(source_paths, cache_dir, get_output_path, build_output):
+  """
+  Build the outputs that do not exist yet on a process pool across all cores and
+  delete outputs in cache_dir that no longer belong to a source.
+  """
+  start_time = time.time()
+  os.makedirs(cache_dir, exist_ok=True)
+
+  expected = {}
+  for source_path in source_paths:
+    try:
+      expected[get_output_path(source_path)] = source_path
+    except OSError as e:
+      print(f"Skipping {source_path}: {e}")
+
+  # Remove outputs for deleted or re-uploaded sources
+  for file in os.listdir(cache_dir):
+    file_path = os.path.join(cache_dir, file)
+    if file_path not in expected:
+      os.remove(file_path)
+
+  missing = {path: source for path, source in expected.items() if not os.path.exists(path)}
+  if missing:
+    # The pool starts from the sync thread while the render, prefetch and decode threads run.
+    # A forked worker could inherit a lock one of them held, workers start from a clean forkserver process instead
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("forkserver")) as executor:
+      with pools_lock:
+        active_pools.add(executor)
+      try:
+        futures = {
+          executor.submit(build_output, source_path, output_path): source_path
+          for output_path, source_path in missing.items()
+        }
+        for future, source_path in futures.items():
+          try:
+            future.result()
+          except CancelledError:
+            print(f"Cancelled building {cache_dir} outputs")
+            break
+          except Exception as e:
+            print(f"Error building {cache_dir} output for {source_path}: {e}")
+      finally:
+        with pools_lock:
+          active_pools.discard(executor)
+
+  print(f"Built {len(missing)} of {len(expected)} outputs for {cache_dir} in {time.time() - start_time:.2f}s")
+
+def shutdown_builds():
+  """Cancel the builds that have not started yet, so exiting does not wait for a whole sync's worth of them."""
+  with pools_lock:
+    pools = list(active_pools)
+  for executor in pools:
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def build_derivatives(photo_paths, screen_size, headroom=MAX_ZOOM):
+  """Build screen sized derivatives for new or changed photos."""
+  build_cached_outputs(
+    photo_paths,
+    os.path.join(DERIVATIVE_DIR, get_screen_profile(screen_size, headroom)),
+    partial(get_derivative_path, screen_size=screen_size, headroom=headroom),
+    partial(build_derivative, screen_size=screen_size, headroom=headroom)
+  )
+
+def build_proxies(video_paths, screen_size):
+  """Transcode new or changed videos to screen resolution proxies."""
+  build_cached_outputs(
+    video_paths,
+    os.path.join(PROXY_DIR, get_proxy_profile(screen_size)),
+    partial(get_proxy_path, screen_size=screen_size),
+    partial(build_proxy, screen_size=screen_size)
+  )
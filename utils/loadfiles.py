@@ -1,10 +1,24 @@
 import os
 import json
-import tkinter as tk
-from tkinter import simpledialog
-from azure.storage.blob import BlobServiceClient  # type: ignore # Azure Storage SDK
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.atomicwrite import write_json_atomic
+
+LOCAL_PHOTO_DIR = "pictures"
+LOCAL_VIDEO_DIR = "videos"
+LOCAL_SPLASH_DIR = "splash"
+METADATA_FILE = "metadata.json"
+SYNC_MANIFEST_FILE = "sync_manifest.json"
+
+# Number of blobs downloaded at the same time
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", 4))
+
+# Set by init_storage()
+AZURE_CONNECTION_STRING = None
+AZURE_CONTAINER_NAME = None
 
 def prompt_for_env_variable(env_var_name, prompt_text):
+    # tkinter is only needed when something is missing, so it is not loaded on a normal start
     import tkinter as tk
     from tkinter import simpledialog
     
@@ -21,88 +35,170 @@ def prompt_for_env_variable(env_var_name, prompt_text):
         root.destroy()
     return value
 
-if not os.getenv("AZURE_CONNECTION_STRING") or not os.getenv("AZURE_CONTAINER_NAME"):
-  # Prompt user to provide both the Azure connection string and container name
-  # and then write a .env file
-  
-  print("Please provide your Azure Storage connection string and container name.")
-  print("You can find these details in the Azure Portal.")
-  print("1. Navigate to your Azure Storage account.")
-  print("2. Under Settings, select Access keys.")
-  print("3. Copy the Connection string value.")
-  print("4. Create a new container under Blob service and copy the name.")
-  print("5. Paste the Connection string and Container name below.")
-  
-  AZURE_CONNECTION_STRING = prompt_for_env_variable("AZURE_CONNECTION_STRING", "Azure Storage Connection String: ")
-  AZURE_CONTAINER_NAME = prompt_for_env_variable("AZURE_CONTAINER_NAME", "Azure Storage Container Name: ")
-else:
-  print("Azure Storage connection details found in .env file.")
-  AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
-  AZURE_CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME")
+def init_storage():
+  """
+  Read the Azure Storage settings, asking for them when they are missing, and create the local media folders.
+  Call once at startup, before the first sync.
+  """
+  global AZURE_CONNECTION_STRING, AZURE_CONTAINER_NAME
+  if not os.getenv("AZURE_CONNECTION_STRING") or not os.getenv("AZURE_CONTAINER_NAME"):
+    # Prompt user to provide both the Azure connection string and container name
+    # and then write a .env file
+    
+    print("Please provide your Azure Storage connection string and container name.")
+    print("You can find these details in the Azure Portal.")
+    print("1. Navigate to your Azure Storage account.")
+    print("2. Under Settings, select Access keys.")
+    print("3. Copy the Connection string value.")
+    print("4. Create a new container under Blob service and copy the name.")
+    print("5. Paste the Connection string and Container name below.")
+    
+    AZURE_CONNECTION_STRING = prompt_for_env_variable("AZURE_CONNECTION_STRING", "Azure Storage Connection String: ")
+    AZURE_CONTAINER_NAME = prompt_for_env_variable("AZURE_CONTAINER_NAME", "Azure Storage Container Name: ")
+  else:
+    print("Azure Storage connection details found in .env file.")
+    AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
+    AZURE_CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME")
 
-print(AZURE_CONNECTION_STRING, AZURE_CONTAINER_NAME)
+  print(f"Syncing from container {AZURE_CONTAINER_NAME}")
 
-LOCAL_PHOTO_DIR = "pictures"
-LOCAL_VIDEO_DIR = "videos"
-LOCAL_SPLASH_DIR = "splash"
-METADATA_FILE = "metadata.json"
+  os.makedirs(LOCAL_PHOTO_DIR, exist_ok=True)
+  os.makedirs(LOCAL_VIDEO_DIR, exist_ok=True)
+  os.makedirs(LOCAL_SPLASH_DIR, exist_ok=True)
+
+def get_local_path(blob_name):
+  if blob_name.startswith("photos/"):
+    return os.path.join(LOCAL_PHOTO_DIR, os.path.basename(blob_name))
+  elif blob_name.startswith("videos/"):
+    return os.path.join(LOCAL_VIDEO_DIR, os.path.basename(blob_name))
+  elif blob_name.startswith("splash/"):
+    return os.path.join(LOCAL_SPLASH_DIR, os.path.basename(blob_name))
+  return None
+
+def load_sync_manifest():
+  """Load the manifest of synced blobs (blob name -> etag, size, last_modified, local_path), None before the first sync."""
+  if os.path.exists(SYNC_MANIFEST_FILE):
+    with open(SYNC_MANIFEST_FILE, "r") as manifest_file:
+      return json.load(manifest_file)
+  return None
+
+def is_blob_synced(entry, previous):
+  if not os.path.exists(entry["local_path"]) or os.path.getsize(entry["local_path"]) != entry["size"]:
+    return False
+  # Files downloaded before the manifest existed are adopted when their size matches
+  if previous is None:
+    return True
+  return previous["etag"] == entry["etag"] and previous["local_path"] == entry["local_path"]
 
-os.makedirs(LOCAL_PHOTO_DIR, exist_ok=True)
-os.makedirs(LOCAL_VIDEO_DIR, exist_ok=True)
-os.makedirs(LOCAL_SPLASH_DIR, exist_ok=True)
+def download_blob_to_file(container_client, blob_name, local_path):
+  # Stream the blob to a temp file in chunks, then move it into place in one step
+  print(f"Downloading {blob_name} to {local_path}")
+  temp_path = local_path + ".part"
+  try:
+    with open(temp_path, "wb") as file:
+      size = container_client.download_blob(blob_name).readinto(file)
+    os.replace(temp_path, local_path)
+  except Exception:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+  return size
 
-def load_files():
+def load_files(on_file_ready=None):
+  """
+  Sync the container into the local media folders.
+  on_file_ready(local_path, file_metadata) is called on the calling thread as each new or changed file lands.
+  """
   metadata = {}
-  downloaded_files = set()
+  downloads = []
+  sync_start = time.time()
   try:
+    # The Azure SDK takes a while to import, it is loaded by the first sync rather than at startup
+    from azure.storage.blob import BlobServiceClient  # type: ignore # Azure Storage SDK
     blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
     container_client = blob_service_client.get_container_client(AZURE_CONTAINER_NAME)
 
-    for blob in container_client.list_blobs():
-      local_path = None
-      if blob.name.startswith("photos/"):
-        local_path = os.path.join(LOCAL_PHOTO_DIR, os.path.basename(blob.name))
-      elif blob.name.startswith("videos/"):
-        local_path = os.path.join(LOCAL_VIDEO_DIR, os.path.basename(blob.name))
-      elif blob.name.startswith("splash/"):
-        local_path = os.path.join(LOCAL_SPLASH_DIR, os.path.basename(blob.name))
-
-      if local_path:
-        downloaded_files.add(local_path)
-        if not os.path.exists(local_path):
-          with open(local_path, "wb") as file:
-            print(f"Downloading {blob.name} to {local_path}")
-            file.write(container_client.download_blob(blob).readall())
-        else:
-          print(f"Skipping {blob.name}, already exists at {local_path}")
-
-        # Explicitly fetch metadata for each blob
-        blob_client = container_client.get_blob_client(blob.name)
-        blob_metadata = blob_client.get_blob_properties().metadata
-        
-        # Save metadata
-        if "contents" in blob_metadata:
-          metadata[local_path] = { "contents": blob_metadata["contents"] }
+    previous_manifest = load_sync_manifest()
+    first_sync = previous_manifest is None
+    previous_manifest = previous_manifest or {}
+    manifest = {}
+
+    for blob in container_client.list_blobs(include=["metadata"]):
+      local_path = get_local_path(blob.name)
+      if not local_path:
+        continue
+      
+      entry = {
+        "etag": blob.etag,
+        "size": blob.size,
+        "last_modified": str(blob.last_modified),
+        "local_path": local_path
+      }
+      previous = previous_manifest.get(blob.name)
+      if is_blob_synced(entry, previous if not first_sync else None):
+        manifest[blob.name] = entry
+      else:
+        downloads.append((blob.name, entry))
+        # Keep tracking the old copy until the new one is in place
+        if previous:
+          manifest[blob.name] = previous
+
+      # Metadata comes back inline with the listing, no per-blob properties request
+      blob_metadata = blob.metadata or {}
+      
+      # Save metadata
+      if "contents" in blob_metadata:
+        metadata[local_path] = { "contents": blob_metadata["contents"] }
     
-     # Cleanup: Delete local files that are not present in Azure blobs
-    local_files = set()
-    for directory in [LOCAL_PHOTO_DIR, LOCAL_VIDEO_DIR, LOCAL_SPLASH_DIR]:
-      for root, _, files in os.walk(directory):
-        for file in files:
-          local_files.add(os.path.join(root, file))
-
-    files_to_delete = local_files - downloaded_files
-    for file in files_to_delete:
-      print(f"Deleting stale file: {file}")
-      os.remove(file)  
+    # Download new and changed files on a bounded pool
+    download_start = time.time()
+    downloaded_bytes = 0
+    downloaded_files = 0
+    failed_files = 0
+    with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as executor:
+      futures = {
+        executor.submit(download_blob_to_file, container_client, blob_name, entry["local_path"]): (blob_name, entry)
+        for blob_name, entry in downloads
+      }
+      for future in as_completed(futures):
+        blob_name, entry = futures[future]
+        try:
+          downloaded_bytes += future.result()
+          downloaded_files += 1
+          manifest[blob_name] = entry
+        except Exception as e:
+          print(f"Error downloading {blob_name}: {e}")
+          failed_files += 1
+          continue
+        if on_file_ready:
+          on_file_ready(entry["local_path"], metadata.get(entry["local_path"], {}))
+    download_time = max(time.time() - download_start, 0.001)
+    if failed_files:
+      print(f"Failed to download {failed_files} of {len(downloads)} files")
+    print(f"Downloaded {downloaded_files} files ({downloaded_bytes / 1024 / 1024:.1f} MB) in {download_time:.2f}s, {downloaded_bytes / 1024 / 1024 / download_time:.2f} MB/s")
+    
+    # Cleanup: Delete local files whose blobs are gone
+    synced_files = {entry["local_path"] for entry in manifest.values()}
+    stale_files = {entry["local_path"] for entry in previous_manifest.values()} - synced_files
+    if first_sync:
+      # No manifest yet, so compare against what is on disk once
+      for directory in [LOCAL_PHOTO_DIR, LOCAL_VIDEO_DIR, LOCAL_SPLASH_DIR]:
+        stale_files |= {os.path.join(directory, file) for file in os.listdir(directory)} - synced_files
+
+    for file in stale_files:
+      if os.path.isfile(file):
+        print(f"Deleting stale file: {file}")
+        os.remove(file)
   
+    write_json_atomic(SYNC_MANIFEST_FILE, manifest)
+
     # Save metadata locally to a JSON file
-    with open(METADATA_FILE, "w") as meta_file:
-        json.dump(metadata, meta_file, indent=4)
-        print(f"Metadata saved to {METADATA_FILE}")
+    write_json_atomic(METADATA_FILE, metadata)
+    print(f"Metadata saved to {METADATA_FILE}")
           
   except Exception as e:
     print(f"Error downloading media from Azure: {e}")
+  print(f"Sync finished in {time.time() - sync_start:.2f}s")
     
 def load_metadata():
     """Load metadata from the local JSON file."""
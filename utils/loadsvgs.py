@@ -1,34 +1,78 @@
-import cairosvg # type: ignore
-import pygame
+import hashlib
+import io
 import os
+import tempfile
+import pygame
+from utils.display import to_display_format
 
 from xml.etree import ElementTree as ET
 
-def load_svg_as_surface(svg_path, size, color="white"):
-  try:
-    # Read and modify the SVG content
-    with open(svg_path, "r") as svg_file:
-      svg_content = svg_file.read()
-    svg_tree = ET.ElementTree(ET.fromstring(svg_content))
-    root = svg_tree.getroot()
+ICON_CACHE_DIR = "icon_cache"
+
+icon_cache = {}  # cache key -> loaded Surface
+
+def get_icon_key(svg_content, size, color):
+  """Identifies a rendered icon by the SVG bytes, the output size and the fill colour."""
+  return hashlib.sha1(svg_content + f"|{size[0]}x{size[1]}|{color}".encode()).hexdigest()
+
+def render_svg(svg_content, size, color):
+  # cairosvg is slow to import, it is only needed when an icon is not cached yet
+  import cairosvg # type: ignore
 
-    # Update `fill` attributes to the specified color
-    for element in root.iter():
-      if "fill" in element.attrib:
-        element.attrib["fill"] = color
+  svg_tree = ET.ElementTree(ET.fromstring(svg_content))
+  root = svg_tree.getroot()
 
-    # Convert the modified SVG back to a string
-    modified_svg = ET.tostring(root, encoding="unicode")
+  # Update `fill` attributes to the specified color
+  for element in root.iter():
+    if "fill" in element.attrib:
+      element.attrib["fill"] = color
 
-    # Render the modified SVG to PNG bytes
-    png_bytes = cairosvg.svg2png(bytestring=modified_svg, output_width=size[0], output_height=size[1])
+  # Convert the modified SVG back to a string
+  modified_svg = ET.tostring(root, encoding="unicode")
 
-    # Save the PNG bytes temporarily and load them with Pygame
-    with open("temp_icon.png", "wb") as temp_file:
+  # Render the modified SVG to PNG bytes
+  return cairosvg.svg2png(bytestring=modified_svg, output_width=size[0], output_height=size[1])
+
+def write_cached_icon(cache_path, png_bytes):
+  # A unique temp file renamed into place, so concurrent loads never read a partial icon
+  os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+  fd, temp_path = tempfile.mkstemp(dir=ICON_CACHE_DIR, suffix=".tmp")
+  try:
+    with os.fdopen(fd, "wb") as temp_file:
       temp_file.write(png_bytes)
-    surface = pygame.image.load("temp_icon.png").convert_alpha()
-    os.remove("temp_icon.png")  # Delete the temporary file
+    os.replace(temp_path, cache_path)
+  except OSError:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+
+def load_svg_as_surface(svg_path, size, color="white"):
+  """
+  Icon surface for an SVG recoloured to color at size.
+  Rendered icons are kept in memory and as PNGs in ICON_CACHE_DIR, so cairosvg only runs the first time.
+  """
+  try:
+    with open(svg_path, "rb") as svg_file:
+      svg_content = svg_file.read()
+    key = get_icon_key(svg_content, size, color)
+    surface = icon_cache.get(key)
+    if surface is not None:
+      return surface
+
+    cache_path = os.path.join(ICON_CACHE_DIR, f"{key}.png")
+    if os.path.exists(cache_path):
+      with open(cache_path, "rb") as cache_file:
+        png_bytes = cache_file.read()
+    else:
+      png_bytes = render_svg(svg_content, size, color)
+      try:
+        write_cached_icon(cache_path, png_bytes)
+      except OSError as e:
+        print(f"Error caching icon {svg_path}: {e}")
+
+    surface = to_display_format(pygame.image.load(io.BytesIO(png_bytes), "icon.png"), alpha=True)
+    icon_cache[key] = surface
     return surface
   except Exception as e:
     print(f"Error loading SVG: {svg_path}, {e}")
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,177 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from utils.atomicwrite import write_json_atomic
+
+# Stage timings are only collected when METRICS_ENABLED is true, otherwise timed() is a shared no-op.
+# The settings are read by load_settings() once .env is loaded, this module is imported before that happens
+METRICS_ENABLED = False
+METRICS_FILE = "metrics.json"
+METRICS_INTERVAL = 10  # seconds between writes of METRICS_FILE
+METRICS_PORT = 0  # serve the metrics on localhost, 0 disables the endpoint
+METRICS_WINDOW = 1000  # most recent samples per stage the percentiles are taken over
+JANK_FACTOR = 2  # a frame is jank when it takes over twice its budget, so at least one refresh was missed
+
+stages = {}  # stage name -> deque of the most recent durations in seconds
+counts = {}  # stage name -> samples recorded since start
+jank = {}  # frame stage name -> frames over budget since start
+gauges = {}  # name -> function returning a JSON serialisable value, read on every snapshot
+lock = threading.Lock()
+start_time = time.time()
+_NOT_TIMED = contextlib.nullcontext()
+_exporter = {"stopped": None, "server": None}
+
+class _StageTimer:
+  __slots__ = ("stage", "start")
+
+  def __init__(self, stage):
+    self.stage = stage
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    record(self.stage, time.perf_counter() - self.start)
+    return False
+
+def timed(stage):
+  """Context manager that records how long its block took under stage."""
+  if not METRICS_ENABLED:
+    return _NOT_TIMED
+  return _StageTimer(stage)
+
+def record(stage, seconds):
+  if not METRICS_ENABLED:
+    return
+  with lock:
+    samples = stages.get(stage)
+    if samples is None:
+      samples = stages[stage] = deque(maxlen=METRICS_WINDOW)
+    samples.append(seconds)
+    counts[stage] = counts.get(stage, 0) + 1
+
+def record_frame(stage, seconds, budget):
+  """Record the time a frame took to draw and count it as jank when it ran well over its budget."""
+  if not METRICS_ENABLED:
+    return
+  record(stage, seconds)
+  if seconds > budget * JANK_FACTOR:
+    with lock:
+      jank[stage] = jank.get(stage, 0) + 1
+
+def add_gauge(name, read):
+  """Include the result of read() in every snapshot, e.g. cache or playback stats."""
+  gauges[name] = read
+
+def get_percentile(sorted_samples, percentile):
+  index = min(len(sorted_samples) - 1, int(len(sorted_samples) * percentile / 100))
+  return sorted_samples[index]
+
+def snapshot():
+  with lock:
+    samples_by_stage = {stage: sorted(samples) for stage, samples in stages.items()}
+    stage_counts = dict(counts)
+    jank_counts = dict(jank)
+
+  report = {}
+  for stage, samples in samples_by_stage.items():
+    report[stage] = {
+      "count": stage_counts[stage],
+      "mean_ms": sum(samples) / len(samples) * 1000,
+      "p50_ms": get_percentile(samples, 50) * 1000,
+      "p95_ms": get_percentile(samples, 95) * 1000,
+      "p99_ms": get_percentile(samples, 99) * 1000,
+      "max_ms": samples[-1] * 1000
+    }
+    if stage in jank_counts:
+      report[stage]["jank"] = jank_counts[stage]
+
+  gauge_values = {}
+  for name, read in gauges.items():
+    try:
+      gauge_values[name] = read()
+    except Exception as e:
+      gauge_values[name] = f"error: {e}"
+
+  return {
+    "time": time.time(),
+    "uptime_s": time.time() - start_time,
+    "window": METRICS_WINDOW,
+    "stages": report,
+    "gauges": gauge_values
+  }
+
+def write_metrics_file(path=None):
+  write_json_atomic(path or METRICS_FILE, snapshot(), indent=2)
+
+def start_metrics_server(port):
+  # http.server is only imported when the endpoint is wanted
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+  class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+      if self.path not in ("/", "/metrics"):
+        self.send_error(404)
+        return
+      body = json.dumps(snapshot(), indent=2).encode()
+      self.send_response(200)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, format, *args):
+      pass  # one line per scrape would drown out the frame's own output
+
+  server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+  threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+  return server
+
+def load_settings():
+  """Read the METRICS_* settings from the environment."""
+  global METRICS_ENABLED, METRICS_FILE, METRICS_INTERVAL, METRICS_PORT
+  METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+  METRICS_FILE = os.getenv("METRICS_FILE", "metrics.json")
+  METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "10"))
+  METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+def start_export():
+  """
+  Load the settings, then write METRICS_FILE every METRICS_INTERVAL seconds and serve the metrics on METRICS_PORT when set.
+  Call it after .env is loaded, stages are not timed before.
+  """
+  load_settings()
+  if not METRICS_ENABLED or _exporter["stopped"]:
+    return
+  stopped = _exporter["stopped"] = threading.Event()
+
+  def export():
+    while not stopped.wait(METRICS_INTERVAL):
+      try:
+        write_metrics_file()
+      except OSError as e:
+        print(f"Error writing metrics to {METRICS_FILE}: {e}")
+  threading.Thread(target=export, name="metrics-export", daemon=True).start()
+
+  if METRICS_PORT:
+    try:
+      _exporter["server"] = start_metrics_server(METRICS_PORT)
+      print(f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+    except OSError as e:
+      print(f"Error starting the metrics endpoint on port {METRICS_PORT}: {e}")
+
+def stop_export():
+  """Stop exporting and write the final metrics."""
+  if not _exporter["stopped"]:
+    return
+  _exporter["stopped"].set()
+  if _exporter["server"]:
+    _exporter["server"].shutdown()
+  try:
+    write_metrics_file()
+  except OSError as e:
+    print(f"Error writing metrics to {METRICS_FILE}: {e}")